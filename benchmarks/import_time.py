@@ -0,0 +1,69 @@
+"""Startup cost of the entry points, measured with `python -X importtime` in fresh interpreters.
+
+Run from the repository root:
+    python -m benchmarks.import_time --output import_times.json
+"""
+import os, sys, json, argparse, subprocess
+import numpy as np
+
+#Entry points and the heavy packages they must not import at startup
+ENTRY_POINTS = {"src.cli": ("matplotlib", "scipy"), "src.main": ("matplotlib", "scipy"), "src.pipeline": ("matplotlib", "scipy"),
+                "src.height_profile": ("matplotlib", "scipy"), "src.focal_mechanism": ("matplotlib", "scipy"),
+                "utils.data_handler": ("matplotlib", "scipy"), "utils.config": ("numpy", "pandas", "matplotlib", "scipy")}
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Measure the import time of the entry points with python -X importtime.")
+    parser.add_argument("--modules", nargs = "+", default = list(ENTRY_POINTS), help = "Modules to import (default: every entry point).")
+    parser.add_argument("--repeat", type = int, default = 5, help = "Fresh interpreters per module; the best and median times are reported (default: 5).")
+    parser.add_argument("--top", type = int, default = 5, help = "Slowest top-level imports listed per module (default: 5).")
+    parser.add_argument("--output", default = "import_times.json", help = "JSON file of the results (default: import_times.json).")
+    return parser.parse_args(argv)
+
+def parse_importtime(stderr):
+    """Rows of -X importtime output as (self_us, cumulative_us, depth, package); depth 0 are the top-level imports."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+def measure(module):
+    """Import module in a fresh interpreter and return its importtime rows."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH = os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output = True, text = True, env = env, cwd = root)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    return parse_importtime(completed.stderr)
+
+def module_report(module, repeat = 5, top = 5):
+    totals, rows = [], []
+    for _ in range(repeat):
+        rows = measure(module)
+        totals.append(next(cumulative for _, cumulative, depth, name in reversed(rows) if depth == 0 and name == module) / 1e6)
+    loaded = {name.split(".")[0] for _, _, _, name in rows}
+    heaviest = sorted(((cumulative, name) for _, cumulative, depth, name in rows if depth == 1), reverse = True)[:top]
+    forbidden = [package for package in ENTRY_POINTS.get(module, ()) if package in loaded]
+    return {"module": module, "seconds": totals, "best": min(totals), "median": float(np.median(totals)),
+            "heaviest": [{"package": name, "seconds": cumulative / 1e6} for cumulative, name in heaviest], "unexpected_imports": forbidden}
+
+def main(argv = None):
+    args = parse_args(argv)
+    reports = []
+    for module in args.modules:
+        report = module_report(module, repeat = args.repeat, top = args.top)
+        reports.append(report)
+        heaviest = ", ".join(f"{entry['package']} {entry['seconds']:.3f}" for entry in report["heaviest"])
+        print(f"{module:<24} {report['best']:>8.3f} s  ({heaviest})")
+        if report["unexpected_imports"]:
+            print(f"    imports {', '.join(report['unexpected_imports'])} at startup")
+    with open(args.output, 'w') as f:
+        json.dump({"python": sys.version, "results": reports}, f, indent = 1)
+    print(f"Saved {args.output}")
+    return 1 if any(report["unexpected_imports"] for report in reports) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
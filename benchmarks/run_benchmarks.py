@@ -0,0 +1,154 @@
+"""Per-stage timings of the profile pipeline on synthetic data, written as JSON.
+
+Run from the repository root:
+    python -m benchmarks.run_benchmarks --sizes 1000 100000 --grid 800 600 --output benchmark_results.json
+    python -m benchmarks.run_benchmarks --sizes 1000 100000 --compare benchmark_results.json
+"""
+import os, sys, json, time, platform, argparse, tempfile
+from io import BytesIO
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from utils.catalog_loader import Catalogloader
+from utils.data_handler import Datahandler
+from utils.spatial_index import Spatialindex
+from utils.grid_loader import Gridloader
+from src.height_profile import Heightprofile
+from src.vector_math import Vectormath
+from src.focal_mechanism import FocalMechanism
+from src.plotter import VerticalSection
+from src.pipeline import draw_profile
+from benchmarks.synthetic_data import synthetic_earthquakes, synthetic_fms, write_catalog, write_dsaa
+
+#Straight profile across the synthetic study area
+PROFILE = {"name": "SYN", "start": [-79.0, 12.5], "end": [-71.0, 8.5], "width": 100.0, "depth": -250.0}
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Time each stage of the profile pipeline on synthetic catalogs and DEMs.")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1_000, 10_000, 100_000], help = "Numbers of earthquakes of the synthetic catalogs (1e3 to 1e7).")
+    parser.add_argument("--fms-size", type = int, default = 1_000, help = "Number of focal mechanisms (default: 1000).")
+    parser.add_argument("--grid", type = int, nargs = 2, default = [800, 600], metavar = ("NX", "NY"), help = "Nodes of the synthetic DSAA grid (default: 800 600).")
+    parser.add_argument("--repeat", type = int, default = 3, help = "Runs of each stage; the best and median times are reported (default: 3).")
+    parser.add_argument("--loop-limit", type = int, default = 200, help = "Mechanisms timed in the per-mechanism loops (default: 200).")
+    parser.add_argument("--output", default = "benchmark_results.json", help = "JSON file of the results (default: benchmark_results.json).")
+    parser.add_argument("--compare", default = None, help = "Earlier results JSON to compare with.")
+    parser.add_argument("--workdir", default = None, help = "Folder for the synthetic files (default: a temporary folder).")
+    return parser.parse_args(argv)
+
+class Stagetimer():
+    """Runs stages a few times and keeps their wall times."""
+    def __init__(self, repeat = 3):
+        self.repeat = repeat
+        self.results = []
+
+    def time(self, stage, size, func, repeat = None):
+        """Time func, record the run and return the value of its last call."""
+        times = []
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            value = func()
+            times.append(time.perf_counter() - start)
+        self.results.append({"stage": stage, "size": size, "seconds": times, "best": min(times), "median": float(np.median(times))})
+        print(f"{stage:<32} {size:>10} {min(times):>10.4f} s")
+        return value
+
+def benchmark_catalog(timer, workdir, num_events):
+    """Catalog loading and swath selection for one catalog size."""
+    earthquake_file = os.path.join(workdir, f"earthquakes_{num_events}.csv")
+    write_catalog(synthetic_earthquakes(num_events), earthquake_file)
+    earthquake_data = timer.time("csv_load", num_events, lambda: Catalogloader().read_earthquakes(earthquake_file))
+    start, end, width, depth = PROFILE["start"], PROFILE["end"], PROFILE["width"], PROFILE["depth"]
+    timer.time("filter_pts", num_events, lambda: Datahandler(earthquake_data, start, end).filter_pts(width, depth))
+    timer.time("project_onto_profile", num_events, lambda: Datahandler(earthquake_data, start, end).project_onto_profile(width, depth))
+    timer.time("project_onto_profile_geodesic", num_events, lambda: Datahandler(earthquake_data, start, end, projection = "geodesic").project_onto_profile(width, depth))
+    spatial_index = timer.time("spatial_index_build", num_events, lambda: Spatialindex(earthquake_data))
+    return timer.time("project_onto_profile_indexed", num_events, lambda: Datahandler(earthquake_data, start, end, spatial_index = spatial_index).project_onto_profile(width, depth))
+
+def benchmark_grid(timer, workdir, nx, ny):
+    """DEM reading and profile sampling."""
+    grd_file = os.path.join(workdir, f"dem_{nx}x{ny}.grd")
+    write_dsaa(grd_file, nx, ny)
+    size = nx * ny
+    height_profile = Heightprofile(grd_file, PROFILE["start"], PROFILE["end"], use_cache = False)
+    timer.time("read_grd_ascii", size, lambda: height_profile.read_grd_ascii(grd_file))
+    timer.time("grid_load_streamed", size, lambda: Gridloader(use_cache = False).load(grd_file))
+    Gridloader().load(grd_file) #Builds the sidecar
+    grid = timer.time("grid_load_cached", size, lambda: Gridloader().load(grd_file))
+    timer.time("extract_profile", size, lambda: Heightprofile(grd_file, PROFILE["start"], PROFILE["end"], grid = grid).extract_profile())
+    timer.time("extract_swath_profile", size, lambda: Heightprofile(grd_file, PROFILE["start"], PROFILE["end"], grid = grid).extract_swath_profile(PROFILE["width"]))
+    return Heightprofile(grd_file, PROFILE["start"], PROFILE["end"], grid = grid).extract_profile()
+
+def benchmark_fms(timer, num_mechanisms, loop_limit):
+    """Beachball geometry: per-mechanism loops on a subset and batched operations on the whole table."""
+    fms_data = synthetic_fms(num_mechanisms)
+    subset = fms_data.iloc[:loop_limit]
+    vector_math = Vectormath()
+    def plane_circles():
+        return [vector_math.generate_plane_circle(row.Strike_1, row.Dip_1, row.B_Az, row.B_pl) for row in subset.itertuples()]
+    circles = timer.time("generate_plane_circle", len(subset), plane_circles)
+    def quadrants():
+        for row, circle in zip(subset.itertuples(), circles):
+            focal_mechanism = FocalMechanism(1.0, (0.0, 0.0), row.Strike_1, row.Dip_1, row.Rake_1, row.Strike_2, row.Dip_2, row.Rake_2, row.P_Az, row.P_pl, row.T_Az, row.T_pl, row.B_Az, row.B_pl)
+            focal_mechanism.construct_quadrants(circle, vector_math.generate_plane_circle(row.Strike_2, row.Dip_2, row.B_Az, row.B_pl))
+    timer.time("construct_quadrants", len(subset), quadrants)
+    timer.time("generate_plane_arcs", num_mechanisms, lambda: vector_math.generate_plane_arcs(fms_data["Strike_1"].values, fms_data["Dip_1"].values, fms_data["B_Az"].values, fms_data["B_pl"].values))
+    timer.time("classify_fms_data", num_mechanisms, lambda: vector_math.classify_fms_data(fms_data))
+    projected_fms_data = fms_data.assign(Profile_X = np.linspace(0, 800, num_mechanisms))
+    def fms_geometry():
+        FocalMechanism.unit_template.cache_clear()
+        return VerticalSection().compute_fms_geometry(projected_fms_data)
+    timer.time("compute_fms_geometry", num_mechanisms, fms_geometry)
+    return projected_fms_data
+
+def benchmark_rendering(timer, projected_earthquake_data, projected_fms_data, distances, elevations, size):
+    """Drawing and rasterizing one section on an Agg figure."""
+    result = {"projected_earthquake_data": projected_earthquake_data, "distances": distances, "elevations": elevations,
+              "fms_geometry": VerticalSection().compute_fms_geometry(projected_fms_data)}
+    def render(earthquake_rendering):
+        fig = Figure(figsize = (15, 9))
+        draw_profile(fig.subplots(), dict(result, projected_earthquake_data = projected_earthquake_data.copy()), PROFILE, earthquake_rendering = earthquake_rendering)
+        fig.savefig(BytesIO(), format = "png", dpi = 100)
+    timer.time("render_section", size, lambda: render("scatter"))
+    timer.time("render_section_density", size, lambda: render("density"))
+
+def environment():
+    import pandas, scipy
+    return {"python": platform.python_version(), "platform": platform.platform(), "numpy": np.__version__, "pandas": pandas.__version__,
+            "scipy": scipy.__version__, "matplotlib": matplotlib.__version__, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def compare(results, baseline_path):
+    """Print the ratio of the best times to those of an earlier run (above 1 is slower)."""
+    with open(baseline_path, 'r') as f:
+        baseline = {(entry["stage"], entry["size"]): entry["best"] for entry in json.load(f)["results"]}
+    print(f"\n{'stage':<32} {'size':>10} {'ratio':>8}")
+    for entry in results:
+        key = (entry["stage"], entry["size"])
+        if key in baseline and baseline[key] > 0:
+            print(f"{entry['stage']:<32} {entry['size']:>10} {entry['best'] / baseline[key]:>8.2f}")
+
+def run(args):
+    timer = Stagetimer(repeat = args.repeat)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        workdir = args.workdir or tmp_dir
+        os.makedirs(workdir, exist_ok = True)
+        distances, elevations = benchmark_grid(timer, workdir, *args.grid)
+        projected_fms_data = benchmark_fms(timer, args.fms_size, args.loop_limit)
+        for num_events in args.sizes:
+            projected_earthquake_data = benchmark_catalog(timer, workdir, num_events)
+            benchmark_rendering(timer, projected_earthquake_data, projected_fms_data.iloc[:50], distances, elevations, num_events)
+    report = {"environment": environment(), "parameters": vars(args), "results": timer.results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent = 1)
+    print(f"Saved {args.output}")
+    return report
+
+def main(argv = None):
+    args = parse_args(argv)
+    report = run(args)
+    if args.compare:
+        compare(report["results"], args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
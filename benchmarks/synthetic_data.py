@@ -0,0 +1,63 @@
+"""Synthetic earthquake catalogs, FMS tables and DSAA grids for the benchmarks, generated offline"""
+import numpy as np
+import pandas as pd
+from src.vector_math import Vectormath
+
+#Study area of the synthetic data (degrees), around the Caribbean profiles of the example
+LON_MIN, LON_MAX, LAT_MIN, LAT_MAX = -80.0, -70.0, 7.0, 14.0
+
+def synthetic_earthquakes(num_events, seed = 0):
+    """Catalog with the columns of the earthquake CSV (Lon, Lat, Depth, Magnitude)."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"Lon": rng.uniform(LON_MIN, LON_MAX, num_events), "Lat": rng.uniform(LAT_MIN, LAT_MAX, num_events),
+                         "Depth": -rng.gamma(2.0, 30.0, num_events).clip(0, 300), "Magnitude": rng.uniform(1.0, 7.0, num_events)})
+
+def planes_from_normal_and_slip(normals, slips):
+    """Strike, dip and rake (degrees) of the planes with the given normals and Aki & Richards slip vectors."""
+    flip = np.where(normals[:, 2] < 0, -1.0, 1.0)[:, np.newaxis] #Normals pointing up
+    normals, slips = normals * flip, slips * flip
+    dips = np.degrees(np.arccos(np.clip(normals[:, 2], -1.0, 1.0)))
+    strikes = np.degrees(np.arctan2(-normals[:, 1], normals[:, 0])) % 360
+    vector_math = Vectormath()
+    strike_vectors, dip_vectors = vector_math.compute_strike_vectors(strikes), vector_math.compute_dip_vectors(strikes, dips)
+    rakes = np.degrees(np.arctan2(-np.sum(slips * dip_vectors, axis = 1), np.sum(slips * strike_vectors, axis = 1)))
+    return strikes, dips, rakes
+
+def axis_angles(vectors):
+    """Azimuth and plunge (degrees) of axes, taken pointing down."""
+    vectors = vectors * np.where(vectors[:, 2] > 0, -1.0, 1.0)[:, np.newaxis]
+    plunges = np.degrees(np.arcsin(np.clip(-vectors[:, 2], -1.0, 1.0)))
+    azimuths = np.degrees(np.arctan2(vectors[:, 0], vectors[:, 1])) % 360
+    return azimuths, plunges
+
+def synthetic_fms(num_mechanisms, seed = 0):
+    """FMS table with consistent nodal planes and P/T/B axes, derived from random strikes, dips and rakes."""
+    rng = np.random.default_rng(seed)
+    data = synthetic_earthquakes(num_mechanisms, seed = seed + 1)
+    strikes, dips, rakes = rng.uniform(0, 360, num_mechanisms), rng.uniform(10, 89, num_mechanisms), rng.uniform(-179, 179, num_mechanisms)
+    vector_math = Vectormath()
+    normals = vector_math.compute_normal_vectors(strikes, dips)
+    slips = vector_math.compute_slip_vectors(strikes, dips, rakes)
+    strikes2, dips2, rakes2 = planes_from_normal_and_slip(slips, normals)
+    columns = {"Date": "2020-01-01", "Time_GMT": "00:00:00", "Lat": data["Lat"], "Lon": data["Lon"], "Depth": data["Depth"], "Magnitude": data["Magnitude"],
+               "Strike_1": strikes, "Dip_1": dips, "Rake_1": rakes, "Strike_2": strikes2, "Dip_2": dips2, "Rake_2": rakes2}
+    for axis, vectors in (("P", (normals - slips) / np.sqrt(2)), ("T", (normals + slips) / np.sqrt(2)), ("B", np.cross(normals, slips))):
+        columns[f"{axis}_Az"], columns[f"{axis}_pl"] = axis_angles(vectors)
+    return pd.DataFrame(columns)
+
+def write_catalog(data, file_path, chunksize = 1_000_000):
+    """Write a catalog as a semicolon separated CSV, chunk by chunk."""
+    for start in range(0, max(len(data), 1), chunksize):
+        data.iloc[start:start + chunksize].to_csv(file_path, sep = ";", index = False, mode = 'w' if start == 0 else 'a', header = start == 0)
+
+def write_dsaa(file_path, nx, ny, block_rows = 256):
+    """Write a smooth synthetic DEM (meters) as a Surfer ASCII grid, a block of rows at a time."""
+    lon = np.linspace(LON_MIN, LON_MAX, nx)
+    lat = np.linspace(LAT_MIN, LAT_MAX, ny)
+    def rows(start, stop):
+        lon_grid, lat_grid = np.meshgrid(lon, lat[start:stop])
+        return 3000.0 * np.sin(lon_grid * 1.3) * np.cos(lat_grid * 0.9) - 1500.0
+    with open(file_path, 'w') as f:
+        f.write(f"DSAA\n{nx} {ny}\n{LON_MIN} {LON_MAX}\n{LAT_MIN} {LAT_MAX}\n-4500.0 1500.0\n")
+        for start in range(0, ny, block_rows):
+            np.savetxt(f, rows(start, min(start + block_rows, ny)), fmt = "%.2f")
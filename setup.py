@@ -6,5 +6,5 @@ setup(
     packages=find_packages(),
     package_dir={'':'src'},
     install_requires = ['requests==2.31.0'],
-    entry_points={'console_scripts':['VertisectGeo=src.main:main']}
+    entry_points={'console_scripts':['VertisectGeo=src.main:main', 'VertisectGeo-render=src.cli:main']}
 )
@@ -0,0 +1,138 @@
+"""Command-line batch renderer: headless (Agg) rendering of many cross-sections, one file per profile or tiled pages"""
+import os, re, argparse
+from concurrent.futures import ProcessPoolExecutor
+from utils.config import Config
+from utils.instrumentation import run_report, call_with_report
+from src.pipeline import read_profiles, grid_bounds, input_files, prepare_inputs, result_cache_from_config, run_report_from_config, result_settings, resolve_num_workers, init_worker, cached_compute_profile, print_profile_summary, draw_profile, figure_options
+
+#Entries of compute_profile results that are only needed for drawing, dropped before returning to the main process
+drawing_entries = ("projected_earthquake_data", "projected_fms_data", "distances", "elevations", "swath_topography")
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(prog = "VertisectGeo-render", description = "Render vertical cross-sections headless, one file per profile or tiled pages.")
+    parser.add_argument("--config", default = "config.json", help = "Path to the configuration file (default: config.json).")
+    parser.add_argument("--output-dir", default = None, help = "Folder of the rendered files (default: figure_path of the config, or the current folder).")
+    parser.add_argument("--prefix", default = None, help = "Start of every file name (default: figure_name of the config without extension).")
+    parser.add_argument("--format", default = "png", choices = ["png", "pdf", "svg", "jpg", "tif"], help = "File format (default: png).")
+    parser.add_argument("--mode", default = "per-profile", choices = ["per-profile", "pages"], help = "One file per profile, or pages of stacked profiles.")
+    parser.add_argument("--profiles-per-page", type = int, default = 4, help = "Profiles stacked in each page in pages mode (default: 4).")
+    parser.add_argument("--dpi", type = int, default = 300, help = "Resolution of raster formats (default: 300).")
+    parser.add_argument("--workers", type = int, default = None, help = "Rendering processes, 0 for one per CPU (default: num_workers of the config).")
+    parser.add_argument("--report", default = None, help = "Write the timing and memory of every stage to this JSON file (overrides processing.run_report).")
+    parser.add_argument("--force", action = "store_true", help = "Render every file, even those the result cache marks as up to date.")
+    args = parser.parse_args(argv)
+    if args.profiles_per_page < 1:
+        parser.error("--profiles-per-page must be at least 1")
+    return args
+
+def file_label(text):
+    """Profile or page name usable in a file name."""
+    return re.sub(r"[^\w\-]+", "_", str(text)).strip("_") or "profile"
+
+def plan_pages(profiles, mode, profiles_per_page, output_dir, prefix, file_format):
+    """Split the profiles into pages and name the file of each one.
+
+    Returns:
+        list: (profiles of the page, output file path) tuples.
+    """
+    if mode == "per-profile":
+        groups = [([profile], f"{prefix}_{i + 1:03d}_{file_label(profile['name'])}") for i, profile in enumerate(profiles)]
+    else:
+        groups = [(profiles[i:i + profiles_per_page], f"{prefix}_page_{i // profiles_per_page + 1:03d}") for i in range(0, len(profiles), profiles_per_page)]
+    return [(page_profiles, os.path.join(output_dir, f"{name}.{file_format}")) for page_profiles, name in groups]
+
+def render_page(page):
+    """Compute and draw the profiles of one page on an Agg figure and save it.
+
+    Runs in the worker processes; the catalogs and DEM come from init_worker. The figure is never handed to pyplot, so
+    no GUI backend is involved.
+
+    Args:
+        page (tuple): Profiles of the page, output file path, dpi and the draw_profile keyword arguments (figure_options).
+
+    Returns:
+        list: compute_profile results of the page without their drawing data.
+    """
+    from matplotlib.figure import Figure
+    page_profiles, output_path, dpi, options = page
+    fig = Figure(figsize = (15, 9 * len(page_profiles)))
+    axes = fig.subplots(nrows = len(page_profiles), ncols = 1, squeeze = False)[:, 0]
+    summaries = []
+    for ax, profile in zip(axes, page_profiles):
+        result = cached_compute_profile(profile)
+        draw_profile(ax, result, profile, **options)
+        summaries.append({key: value for key, value in result.items() if key not in drawing_entries})
+    fig.tight_layout()
+    with run_report.stage("savefig", rows = len(page_profiles)):
+        fig.savefig(output_path, dpi = dpi)
+    return summaries
+
+def render(config, output_dir, prefix, file_format = "png", mode = "per-profile", profiles_per_page = 4, dpi = 300, num_workers = 1, force = False):
+    """Render every profile of a configuration.
+
+    With a result cache (processing.cache_dir), files rendered from unchanged profiles and inputs are skipped, and only
+    the profiles whose parameters or input files changed are recomputed.
+
+    Returns:
+        list: Paths of the written files.
+    """
+    profiles = read_profiles(config["point_profiles"])
+    os.makedirs(output_dir, exist_ok = True)
+    pages = plan_pages(profiles, mode, profiles_per_page, output_dir, prefix, file_format)
+    result_cache = result_cache_from_config(config)
+    options = figure_options(config.get("figure_parameters", {}))
+    settings = {"dpi": dpi, **options} #Figure settings recorded for every rendered file
+    compute_settings = result_settings(config)
+    if result_cache is not None:
+        fingerprints = result_cache.input_fingerprints(input_files(config))
+        manifest = result_cache.read_manifest()
+        page_keys = [[result_cache.profile_key(profile, fingerprints, compute_settings) for profile in page_profiles] for page_profiles, _ in pages]
+        if not force:
+            pending = [i for i, (_, output_path) in enumerate(pages) if not result_cache.is_rendered(manifest, output_path, page_keys[i], settings)]
+            print(f"Files up to date: {len(pages) - len(pending)} of {len(pages)}.")
+            pages, page_keys = [pages[i] for i in pending], [page_keys[i] for i in pending]
+    earthquake_data, fms_data, grd_file, fingerprints = prepare_inputs(config, [profile for page_profiles, _ in pages for profile in page_profiles], result_cache)
+    tasks = [(page_profiles, output_path, dpi, options) for page_profiles, output_path in pages]
+    num_workers = min(resolve_num_workers(num_workers), max(len(tasks), 1))
+    dem_bounds = grid_bounds([profile for page_profiles, _ in pages for profile in page_profiles])
+    initargs = (earthquake_data, fms_data, grd_file, result_cache, fingerprints, dem_bounds, (run_report.enabled, run_report.trace_memory), compute_settings)
+    if num_workers <= 1:
+        init_worker(*initargs)
+        page_summaries = [render_page(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers = num_workers, initializer = init_worker, initargs = initargs) as executor:
+            outputs = list(executor.map(call_with_report, [(render_page, task) for task in tasks]))
+        for _, records in outputs:
+            run_report.merge(records)
+        page_summaries = [summaries for summaries, _ in outputs]
+    for (_, output_path), summaries in zip(pages, page_summaries):
+        for summary in summaries:
+            print_profile_summary(summary)
+        print(f"Saved {output_path}")
+    if result_cache is not None and pages:
+        manifest.update({os.path.abspath(output_path): result_cache.output_entry(keys, settings) for (_, output_path), keys in zip(pages, page_keys)})
+        result_cache.write_manifest(manifest)
+    return [output_path for _, output_path in pages]
+
+def main(argv = None):
+    args = parse_args(argv)
+    import matplotlib
+    matplotlib.use("Agg") #Headless; pages are drawn on Figure objects, so pyplot is never needed
+    config = Config.load_config(args.config)
+    if not config:
+        return 1
+    config_figure = config.get("figure_parameters", {})
+    output_dir = args.output_dir or config_figure.get("figure_path", ".")
+    prefix = args.prefix or os.path.splitext(config_figure.get("figure_name", "section"))[0]
+    num_workers = args.workers if args.workers is not None else config.get("processing", {}).get("num_workers", 1)
+    if args.report:
+        config.setdefault("processing", {})["run_report"] = args.report
+    report_path = run_report_from_config(config)
+    render(config, output_dir, prefix, file_format = args.format, mode = args.mode, profiles_per_page = args.profiles_per_page, dpi = args.dpi, num_workers = num_workers, force = args.force)
+    if report_path:
+        run_report.write(report_path)
+    print("FINISHED")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
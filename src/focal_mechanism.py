@@ -1,10 +1,10 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
-from math import sqrt
+from math import pi
+from functools import lru_cache
 from src.vector_math import Vectormath
 
 class FocalMechanism(Vectormath):
+    template_decimals = 1 #Fault-plane parameters are rounded to this many decimals to key the beachball template cache
     def __init__(self, radius, center, strike1, dip1, rake1, strike2, dip2, rake2, P_Az, P_pl, T_Az, T_pl, B_Az, B_pl):
         super().__init__()
         self.radius = radius
@@ -23,57 +23,102 @@ class FocalMechanism(Vectormath):
         self.B_pl = B_pl
     #region Construc quadrants
     
-    def construct_quadrants(self, nodal_plane_sorted1, nodal_plane_sorted2):
-        first_half_projx1, first_half_projy1, second_half_projx1, second_half_projy1 = super().slice_circle(nodal_plane_sorted1)
-        first_half_projx2, first_half_projy2, second_half_projx2, second_half_projy2 = super().slice_circle(nodal_plane_sorted2)
-        #Points on the circle
-        S1_proj = np.array([first_half_projx1[0], first_half_projy1[0]])
-        neg_S1_proj = np.array([second_half_projx1[-1], second_half_projy1[-1]])
-        S2_proj = np.array([first_half_projx2[0], first_half_projy2[0]])
-        neg_S2_proj = np.array([second_half_projx2[-1], second_half_projy2[-1]])
-        #Verify the radius
-        radius_S1 = np.linalg.norm(S1_proj)
-        radius_neg_S1 = np.linalg.norm(neg_S1_proj)
-        radius_S2 = np.linalg.norm(S2_proj)
-        radius_neg_S2 = np.linalg.norm(neg_S2_proj)
-        radius = sqrt(2)
-        assert np.isclose(radius_S1, radius_S2, radius_neg_S1, radius_neg_S2, radius), "Points are not on the same circle."
-        #Create 4 arcs
-        arc1 = super().create_arc(S1_proj, S2_proj, radius)
-        arc2 = super().create_arc(S2_proj, neg_S1_proj, radius)
-        arc3 = super().create_arc(neg_S2_proj, neg_S1_proj, radius)
-        arc4 = super().create_arc(neg_S2_proj, S1_proj, radius)
-        #Create sides (in projected coordinates)
-        side_pts_first_half1 = np.vstack((first_half_projx1, first_half_projy1))
-        side_pts_second_half1 = np.vstack((second_half_projx1, second_half_projy1))
-        side_pts_first_half2 = np.vstack((first_half_projx2, first_half_projy2))
-        side_pts_second_half2 = np.vstack((second_half_projx2, second_half_projy2))
-        #Create polygons
-        polygon1 = arc1
-        if np.allclose(polygon1[:, -1], side_pts_first_half2[:, 0]):
-            polygon1 = np.hstack((polygon1, side_pts_first_half2[:, 1:], side_pts_first_half1[:, ::-1][:, 1:]))
-        else:
-            polygon1 = np.hstack((polygon1, side_pts_first_half1[:, 1:], side_pts_first_half2[:, ::-1][:, 1:]))
-
-        polygon2 = arc2
-        if np.allclose(polygon2[:, -1], side_pts_second_half1[:, -1]):
-            polygon2 = np.hstack((polygon2, side_pts_second_half1[:, ::-1][:, 1:-1], side_pts_first_half2[:, ::-1]))
-        else:
-            polygon2 = np.hstack((polygon2, side_pts_first_half2[:, 1:], side_pts_second_half1[:, 1:]))
-
-        polygon3 = arc3
-        if np.allclose(polygon3[:, -1], side_pts_second_half2[:, -1]):
-            polygon3 = np.hstack((polygon3, side_pts_second_half2[:, ::-1][:, 1:-1], side_pts_second_half1))
-        else:
-            polygon1 = np.hstack((polygon1, side_pts_second_half1[:, ::-1][:, 1:-1], side_pts_second_half2))
-
-        polygon4 = arc4
-        if np.allclose(polygon4[:, -1], side_pts_first_half1[:, 0]):
-            polygon4 = np.hstack((polygon4, side_pts_first_half1[:, 1:-1], side_pts_second_half2))
-        else:
-            polygon4 = np.hstack((polygon4, side_pts_second_half2[:, ::-1][:, 1:-1], side_pts_first_half1[:, ::-1]))
-
-        return polygon1, polygon2, polygon3, polygon4
+    def quadrant_geometry(self, nodal_plane1, nodal_plane2, num_circle_pts = 200):
+        """Quadrant polygons of a beachball and a direction inside each quadrant.
+
+        Each quadrant is the part of the lower hemisphere on one side of each nodal plane, a convex spherical region. Its
+        boundary is made of the samples of both nodal-plane arcs and of the primitive circle that are on the right side
+        of the other planes, ordered by their angle around a direction inside the region, so the four quadrants tile the
+        projected disc whatever the orientation, including dip-slip mechanisms whose B axis is on the primitive circle.
+
+        Args:
+            nodal_plane1, nodal_plane2 (ndarray): (4, N) arcs of the nodal planes from generate_plane_circle.
+            num_circle_pts (int, optional): Samples of the whole primitive circle. Defaults to 200.
+
+        Returns:
+            tuple: The four (2, M) polygons in projected coordinates (radius sqrt(2)), and the (4, 3) directions a * n1 + b * n2
+                of their quadrants, where n1 and n2 are the normals of the nodal planes and a, b are +1 or -1.
+        """
+        tolerance = 1e-9
+        arcs, normals = [], []
+        for nodal_plane in (nodal_plane1, nodal_plane2):
+            points = nodal_plane[:3] / np.linalg.norm(nodal_plane[:3], axis = 0)
+            crossed = np.cross(points[:, 0], points.T)
+            normals.append(crossed[np.argmax(np.linalg.norm(crossed, axis = 1))] / np.linalg.norm(crossed, axis = 1).max())
+            arcs.append(points)
+        normal1, normal2 = normals
+        #Both arcs go through the exact intersection of the planes instead of the catalog B axis
+        B_vec = np.cross(normal1, normal2)
+        B_vec /= np.linalg.norm(B_vec)
+        for points, nodal_plane in zip(arcs, (nodal_plane1, nodal_plane2)):
+            b_index = np.flatnonzero(nodal_plane[3] == 1)[0]
+            points[:, b_index] = B_vec if np.dot(B_vec, points[:, b_index]) >= 0 else -B_vec
+        angles = np.linspace(0, 2 * pi, num_circle_pts, endpoint = False)
+        circle = np.hstack((np.vstack((np.cos(angles), np.sin(angles), np.zeros(num_circle_pts))), arcs[0][:, [0, -1]], arcs[1][:, [0, -1]]))
+        arc1_side2, arc2_side1 = normal2 @ arcs[0], normal1 @ arcs[1]
+        circle_side1, circle_side2 = normal1 @ circle, normal2 @ circle
+        polygons, directions = [], []
+        for a, b in ((1, 1), (1, -1), (-1, -1), (-1, 1)):
+            on_circle = (a * circle_side1 >= -tolerance) & (b * circle_side2 >= -tolerance)
+            boundary = np.hstack((arcs[0][:, b * arc1_side2 >= -tolerance], arcs[1][:, a * arc2_side1 >= -tolerance], circle[:, on_circle]))
+            inside = boundary.mean(axis = 1)
+            if np.linalg.norm(inside) > tolerance:
+                #Angle of every boundary point around the inside direction
+                inside /= np.linalg.norm(inside)
+                axis1 = np.cross(inside, [0.0, 0.0, 1.0] if abs(inside[2]) < 0.9 else [1.0, 0.0, 0.0])
+                axis1 /= np.linalg.norm(axis1)
+                axis2 = np.cross(inside, axis1)
+                boundary = boundary[:, np.argsort(np.arctan2(axis2 @ boundary, axis1 @ boundary), kind = "stable")]
+            projected = np.vstack(self.lambert_projection(boundary[0], boundary[1], boundary[2]))
+            if abs(np.dot(projected[0], np.roll(projected[1], -1)) - np.dot(projected[1], np.roll(projected[0], -1))) < tolerance:
+                projected = np.repeat(projected[:, :1], 3, axis = 1) #Quadrant outside the lower hemisphere, drawn as a point
+            polygons.append(projected)
+            directions.append(a * normal1 + b * normal2)
+        return polygons, np.array(directions)
+
+    def construct_quadrants(self, nodal_plane1, nodal_plane2):
+        """The four quadrant polygons (2, M) in projected coordinates (radius sqrt(2)), see quadrant_geometry."""
+        return tuple(self.quadrant_geometry(nodal_plane1, nodal_plane2)[0])
+    #endregion
+    #region Beachball templates
+    def template_key(self):
+        """Rounded orientation parameters that fully determine the beachball in unit space."""
+        angles = (self.strike1, self.dip1, self.strike2, self.dip2, self.P_Az, self.P_pl, self.T_Az, self.T_pl, self.B_Az, self.B_pl)
+        return tuple(round(float(angle), self.template_decimals) for angle in angles)
+
+    def compute_unit_template(self):
+        """Quadrant polygons of radius 1 centered at the origin, and their polarity.
+
+        Returns:
+            tuple: The four (2, N) polygons and a tuple of four booleans (True for the compressional quadrants, those of
+            the T axis), or None as fill pattern when the polarity cannot be decided (T and P on the nodal planes).
+        """
+        nodal_plane1 = super().generate_plane_circle(self.strike1, self.dip1, self.B_Az, self.B_pl)
+        nodal_plane2 = super().generate_plane_circle(self.strike2, self.dip2, self.B_Az, self.B_pl)
+        quadrants, directions = self.quadrant_geometry(nodal_plane1, nodal_plane2)
+        polygons = [self.scale_points(polygon, 1.0) for polygon in quadrants]
+        for polygon in polygons:
+            polygon.setflags(write = False) #Templates are shared through the cache
+        #Polarity of each quadrant from a direction strictly inside it
+        normal1 = super().compute_normal_vector(self.strike1, self.dip1)
+        normal2 = super().compute_normal_vector(self.strike2, self.dip2)
+        T_vec = super().compute_kinematic_vector(self.T_Az, self.T_pl)
+        P_vec = super().compute_kinematic_vector(self.P_Az, self.P_pl) if self.P_Az is not None else None
+        compressional = super().classify_polarity(directions, np.tile(normal1, (4, 1)), np.tile(normal2, (4, 1)), np.tile(T_vec, (4, 1)), None if P_vec is None else np.tile(P_vec, (4, 1)))
+        if not compressional.any():
+            return tuple(polygons), None
+        return tuple(polygons), tuple(bool(filled) for filled in compressional)
+
+    @staticmethod
+    @lru_cache(maxsize = 4096)
+    def unit_template(template_key):
+        """Bounded LRU cache of unit beachball templates keyed by FocalMechanism.template_key."""
+        strike1, dip1, strike2, dip2, P_Az, P_pl, T_Az, T_pl, B_Az, B_pl = template_key
+        focal_mechanism = FocalMechanism(1.0, (0.0, 0.0), strike1, dip1, None, strike2, dip2, None, P_Az, P_pl, T_Az, T_pl, B_Az, B_pl)
+        return focal_mechanism.compute_unit_template()
+
+    def get_unit_template(self):
+        return FocalMechanism.unit_template(self.template_key())
     #endregion
     #region Draw a single FM
     def draw_rake(self, ax, axis, axis_name):
@@ -101,30 +146,12 @@ class FocalMechanism(Vectormath):
         #Plot origin
         origin = np.array(self.center).reshape(2, 1)
         ax.scatter(origin[0], origin[1], color = 'k')
-        #Fill up the polygons according to T location
-        T_vec = super().compute_kinematic_vector(self.T_Az, self.T_pl)
-        T_proj_x, T_proj_y = super().lambert_projection(T_vec[0], T_vec[1], T_vec[2])
-        T_proj = np.array([[T_proj_x], [T_proj_y]])
-        T_proj = super().scale_points(T_proj, self.radius)
-        T_proj = super().translate_points(T_proj, self.center)
-
-        nodal_plane1 = super().generate_plane_circle(self.strike1, self.dip1, self.B_Az, self.B_pl)
-        nodal_plane2 = super().generate_plane_circle(self.strike2, self.dip2, self.B_Az, self.B_pl)
-        polygon1, polygon2, polygon3, polygon4 = self.construct_quadrants(nodal_plane1, nodal_plane2)
-        #Scale and translate
-        polygon1, polygon2, polygon3, polygon4 = super().scale_points(polygon1, self.radius), super().scale_points(polygon2, self.radius), super().scale_points(polygon3, self.radius), super().scale_points(polygon4, self.radius)
-        polygon1, polygon2, polygon3, polygon4 = super().translate_points(polygon1, self.center), super().translate_points(polygon2, self.center), super().translate_points(polygon3, self.center), super().translate_points(polygon4, self.center)
-        polygons = [polygon1, polygon2, polygon3, polygon4]
-
-        containing_index = None
-        for i, polygon in enumerate(polygons):
-            if super().point_in_polygon(T_proj, polygon):
-                containing_index = i
-                break
-        if containing_index is not None:
-            second_index = (containing_index + 2) % len(polygons)
-            for i, polygon in enumerate(polygons):
-                if i == containing_index or i == second_index:
+        #Fill up the polygons according to T location, from the cached unit template
+        unit_polygons, fill_pattern = self.get_unit_template()
+        if fill_pattern is not None:
+            for unit_polygon, filled in zip(unit_polygons, fill_pattern):
+                polygon = self.radius * unit_polygon + origin
+                if filled:
                     ax.fill(polygon[0], polygon[1], color = f"black", zorder = 5)
                 else:
                     ax.fill(polygon[0], polygon[1], color = f"white", edgecolor = f"black", zorder = 5)
@@ -139,6 +166,7 @@ class FocalMechanism(Vectormath):
         #B_vec = super().compute_kinematic_vector(self.B_Az, self.B_pl)
         #self.draw_kinematic_axis(ax, B_vec,  "B")
         #Add stereonet boundary
+        import matplotlib.pyplot as plt
         circle = plt.Circle(self.center, self.radius, color='black', fill=False, linewidth=1)
         ax.add_artist(circle)
         #Figure optionals
@@ -149,4 +177,113 @@ class FocalMechanism(Vectormath):
         #ax.set_ylabel('y')
         #ax.legend()
         #plt.show()
-    #endregion
\ No newline at end of file
+    #endregion
+class FocalMechanismSet():
+    """Struct-of-arrays container of many focal mechanisms.
+
+    The nodal planes and P/T/B axes are stored as one contiguous float32 array per column (a (12, N) block, 48 bytes
+    per mechanism), with the beachball centers (Profile_X, Depth) and the index labels of the source DataFrame.
+    Indexing with a slice, an integer array or a boolean mask (for example the swath mask of a profile) returns a new
+    set, and every geometry method works on all the mechanisms at once; beachball polygons are built once per unique
+    rounded orientation through the FocalMechanism template cache.
+    """
+    columns = ("Strike_1", "Dip_1", "Rake_1", "Strike_2", "Dip_2", "Rake_2", "P_Az", "P_pl", "T_Az", "T_pl", "B_Az", "B_pl")
+    template_columns = ("Strike_1", "Dip_1", "Strike_2", "Dip_2", "P_Az", "P_pl", "T_Az", "T_pl", "B_Az", "B_pl") #Order of FocalMechanism.template_key
+    vector_math = Vectormath()
+
+    def __init__(self, angles, centers = None, index = None):
+        self.angles = np.ascontiguousarray(angles, dtype = np.float32).reshape(len(self.columns), -1)
+        num_mechanisms = self.angles.shape[1]
+        self.centers = np.zeros((num_mechanisms, 2), dtype = np.float32) if centers is None else np.ascontiguousarray(centers, dtype = np.float32)
+        self.index = np.arange(num_mechanisms) if index is None else np.asarray(index)
+
+    @classmethod
+    def from_dataframe(cls, fms_data, x_column = "Profile_X", depth_column = "Depth"):
+        """Set built from the columns of an FMS table. Centers are (x_column, depth_column), zeros when x_column is missing."""
+        angles = np.empty((len(cls.columns), len(fms_data)), dtype = np.float32)
+        for row, column in enumerate(cls.columns):
+            angles[row] = fms_data[column].to_numpy(dtype = np.float32)
+        centers = None
+        if x_column in fms_data and depth_column in fms_data:
+            centers = np.column_stack((fms_data[x_column].to_numpy(dtype = np.float32), fms_data[depth_column].to_numpy(dtype = np.float32)))
+        return cls(angles, centers, fms_data.index.to_numpy())
+
+    def __len__(self):
+        return self.angles.shape[1]
+
+    def __getitem__(self, key):
+        """Mechanisms selected by a slice, integer indices or a boolean mask, as a new set."""
+        if isinstance(key, (int, np.integer)):
+            key = slice(key, key + 1 if key != -1 else None)
+        return FocalMechanismSet(self.angles[:, key], self.centers[key], self.index[key])
+
+    def column(self, name):
+        """float32 array of one of the columns, e.g. "Strike_1" or "T_pl"."""
+        return self.angles[self.columns.index(name)]
+
+    @property
+    def nbytes(self):
+        return self.angles.nbytes + self.centers.nbytes + self.index.nbytes
+    #region Vectors
+    def vectors(self):
+        """Normals of both nodal planes and the P, T and B axes, as (N, 3) float64 arrays keyed "N1", "N2", "P", "T" and "B"."""
+        column = lambda name: self.column(name).astype(float)
+        vector_math = self.vector_math
+        return {"N1": vector_math.compute_normal_vectors(column("Strike_1"), column("Dip_1")),
+                "N2": vector_math.compute_normal_vectors(column("Strike_2"), column("Dip_2")),
+                **{axis: vector_math.compute_kinematic_vectors(column(f"{axis}_Az"), column(f"{axis}_pl")) for axis in ("P", "T", "B")}}
+
+    def check_consistency(self, tolerance = 10.0):
+        """Boolean array, True for the mechanisms whose P/T/B axes are inconsistent with their nodal planes."""
+        vectors = self.vectors()
+        return self.vector_math.check_axes_consistency(vectors["N1"], vectors["N2"], vectors["P"], vectors["T"], vectors["B"], tolerance = tolerance)
+
+    def plane_arcs(self, plane = 1, num_pts = 50):
+        """Lower-hemisphere arcs of nodal plane 1 or 2 of every mechanism, an (N, 4, num_pts) array (see generate_plane_arcs)."""
+        strikes, dips = self.column(f"Strike_{plane}").astype(float), self.column(f"Dip_{plane}").astype(float)
+        return self.vector_math.generate_plane_arcs(strikes, dips, self.column("B_Az").astype(float), self.column("B_pl").astype(float), num_pts = num_pts)
+    #endregion
+    #region Projection
+    def project_axes(self, axis = "P", radius = 1.0):
+        """Lambert projection of the P, T or B axis of every mechanism inside its beachball, an (N, 2) array in data coordinates."""
+        vectors = self.vector_math.compute_kinematic_vectors(self.column(f"{axis}_Az").astype(float), self.column(f"{axis}_pl").astype(float))
+        vectors = np.where(vectors[:, 2:] > 0, -vectors, vectors) #Lower hemisphere
+        x_proj, y_proj = self.vector_math.lambert_projection(vectors[:, 0], vectors[:, 1], vectors[:, 2])
+        return radius / np.sqrt(2) * np.column_stack((x_proj, y_proj)) + self.centers
+    #endregion
+    #region Beachballs
+    def template_keys(self):
+        """(N, 10) rounded orientations keying the FocalMechanism template cache."""
+        rows = [self.columns.index(column) for column in self.template_columns]
+        return np.round(self.angles[rows].T.astype(float), FocalMechanism.template_decimals)
+
+    def compute_geometry(self, radius = 10):
+        """Beachball polygons of every mechanism, computing and scaling each unique orientation once.
+
+        Mechanisms with the same rounded orientation share the same polygon arrays, which are relative to the center of
+        the beachball; offsets holds the center of every polygon, so they are drawn with a PolyCollection with offsets.
+
+        Returns:
+            dict: "polygons" (list of (M, 2) arrays relative to the center, four per mechanism with a defined polarity, in
+            the order of the set), "offsets" (one center per polygon), "facecolors", "centers" (N, 2), "radii" (N, )
+            and "flagged" (index labels of the inconsistent mechanisms, including those without a defined polarity,
+            which are not drawn).
+        """
+        centers = self.centers.astype(float)
+        polygons, offsets, facecolors = [], np.empty((0, 2)), []
+        if len(self):
+            keys = np.ascontiguousarray(self.template_keys() + 0.0) #+ 0.0 turns -0.0 into 0.0 so equal keys have equal bytes
+            _, first, inverse = np.unique(keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel(), return_index = True, return_inverse = True)
+            inverse = inverse.ravel()
+            templates = [FocalMechanism.unit_template(tuple(key)) for key in keys[first].tolist()]
+            drawn_templates = np.array([fill_pattern is not None for _, fill_pattern in templates], dtype = bool)
+            scaled_templates = [[radius * unit_polygon.T for unit_polygon in unit_polygons] for unit_polygons, _ in templates]
+            fill_patterns = np.array([fill_pattern if fill_pattern is not None else (False, ) * 4 for _, fill_pattern in templates], dtype = bool)
+            drawn = np.flatnonzero(drawn_templates[inverse])
+            mechanism_templates = inverse[drawn]
+            polygons = [polygon for template_id in mechanism_templates.tolist() for polygon in scaled_templates[template_id]]
+            offsets = np.repeat(centers[drawn], 4, axis = 0)
+            facecolors = np.where(fill_patterns[mechanism_templates].ravel(), "black", "white").tolist()
+        flagged = self.index[self.check_consistency() | ~drawn_templates[inverse]].tolist() if len(self) else []
+        return {"polygons": polygons, "offsets": offsets, "facecolors": facecolors, "centers": centers, "radii": np.full(len(self), float(radius)), "flagged": flagged}
+    #endregion
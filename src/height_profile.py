@@ -1,25 +1,22 @@
 import numpy as np
-from shapely.geometry import LineString
-from scipy.interpolate import RegularGridInterpolator
+from utils.grid_loader import Gridloader
+from utils.projection import profile_projection
+from utils.instrumentation import run_report
 
 class Heightprofile():
-    def __init__(self, grd_file, start_coords, end_coords):
+    window_nodes = 4_000_000 #Largest number of grid nodes read at once by the swath sampling
+
+    def __init__(self, grd_file, start_coords, end_coords, use_cache = True, grid = None, projection = "flat", vertices = None, bounds = None):
         self.grd_file = grd_file
         self.start_coords = start_coords
         self.end_coords = end_coords
+        self.grid_loader = Gridloader(use_cache = use_cache)
+        self.grid = grid #(lon, lat, data) already loaded, to share one grid between profiles
+        self.interpolator = None
+        self.projection = projection #Profileprojection method, the same one used by Datahandler for Profile_X
+        self.vertices = vertices #Vertices of a polyline profile, from start_coords to end_coords
+        self.bounds = bounds #(lon_min, lon_max, lat_min, lat_max) window of the grid to read, None for the whole grid
 
-    @staticmethod
-    def lon_to_km(lon):
-        scale_factor = 111.0  #X coordinates, adjusting for variation in latitude
-        lon_km = scale_factor * lon
-        return lon_km
-    
-    @staticmethod
-    def lat_to_km(lat):
-        scale_factor = 111.0
-        lat_km = scale_factor * lat #Y coordinates
-        return lat_km
-    
     @staticmethod
     def meters_to_km(depth):
         scale_factor = 1/1000
@@ -73,31 +70,184 @@ class Heightprofile():
         lon_range = np.linspace(lon_min, lon_max, nx)
         lat_range = np.linspace(lat_min, lat_max, ny)
         return lon_range, lat_range, data_km
+
+    @run_report.timed("read_grid", rows = lambda grid: grid[2].size)
+    def read_grid(self, file_path):
+        """Reads a Surfer grid (DSAA, DSBB or DSRB) through the binary grid cache, only inside bounds when given.
+
+        Args:
+            file_path (str): Location of the file.
+
+        Returns:
+            tuple: lon, lat, data (meters, memory-mapped when possible)
+        """
+        return self.grid_loader.load(file_path, bounds = self.bounds)
     
+    def load_grid(self):
+        """Loads the grid once per instance (or uses the grid passed to the constructor)."""
+        if self.grid is None:
+            self.grid = self.read_grid(self.grd_file)
+        return self.grid
+
+    def build_interpolator(self):
+        """Builds the grid interpolator once per instance."""
+        if self.interpolator is None:
+            from scipy.interpolate import RegularGridInterpolator
+            lon, lat, data = self.load_grid()
+            self.interpolator = RegularGridInterpolator((lat, lon), data, bounds_error=False, fill_value=np.nan)
+        return self.interpolator
+
+    def sample_elevations(self, lons, lats):
+        """Samples the grid at many points in a single interpolator call.
+
+        Args:
+            lons (array_like): Longitudes of the sample points (any shape).
+            lats (array_like): Latitudes of the sample points (same shape as lons).
+
+        Returns:
+            ndarray: Elevations (km) with the shape of lons. NaN outside the grid or on blanked nodes.
+        """
+        interpolator = self.build_interpolator()
+        lons, lats = np.asarray(lons, dtype = float), np.asarray(lats, dtype = float)
+        points = np.column_stack((lats.ravel(), lons.ravel()))
+        elevations = interpolator(points).reshape(lons.shape)
+        return self.meters_to_km(self.grid_loader.mask_blanks(elevations))
+
+    def grid_window(self, lons, lats):
+        """Row and column slices of the smallest block of grid nodes (at least 2 x 2) around the points."""
+        lon, lat, _ = self.load_grid()
+        return self.grid_loader.window_slices(lon, lat, (np.nanmin(lons), np.nanmax(lons), np.nanmin(lats), np.nanmax(lats)))
+
+    def sample_window(self, lons, lats):
+        """Grid values (meters) at flat arrays of points, interpolated on the block of grid nodes around them only."""
+        from scipy.interpolate import RegularGridInterpolator
+        lon, lat, data = self.load_grid()
+        rows, cols = self.grid_window(lons, lats)
+        window = np.asarray(data[rows, cols], dtype = float)
+        interpolator = RegularGridInterpolator((lat[rows], lon[cols]), window, bounds_error=False, fill_value=np.nan)
+        return interpolator(np.column_stack((lats, lons)))
+
+    def sample_elevations_windowed(self, lons, lats):
+        """sample_elevations reading only bounded windows of the grid.
+
+        When the block of grid nodes around all the points holds more than window_nodes nodes, the points are
+        bucketed into square tiles of grid cells, small enough for the block of each tile to fit in window_nodes,
+        and each tile is interpolated once, whatever the order of the points. Linear interpolation only uses the
+        nodes around a point, so the result is the same as sampling the whole grid.
+
+        Args:
+            lons (ndarray): Longitudes of the sample points (any shape).
+            lats (ndarray): Latitudes of the sample points, same shape as lons.
+
+        Returns:
+            ndarray: Elevations (km) with the shape of lons. NaN outside the grid or on blanked nodes.
+        """
+        lons, lats = np.asarray(lons, dtype = float), np.asarray(lats, dtype = float)
+        flat_lons, flat_lats = lons.ravel(), lats.ravel()
+        rows, cols = self.grid_window(flat_lons, flat_lats)
+        if (rows.stop - rows.start) * (cols.stop - cols.start) <= self.window_nodes:
+            elevations = self.sample_window(flat_lons, flat_lats)
+        else:
+            lon, lat, _ = self.load_grid()
+            tile_size = max(int(np.sqrt(self.window_nodes)) - 1, 1) #Cells per tile side; the block of a tile spans tile_size + 1 nodes
+            elevations = np.full(flat_lons.shape, np.nan)
+            finite = np.flatnonzero(np.isfinite(flat_lons) & np.isfinite(flat_lats))
+            tile_cols = np.clip(np.searchsorted(lon, flat_lons[finite], side = "right") - 1, 0, len(lon) - 2) // tile_size
+            tile_rows = np.clip(np.searchsorted(lat, flat_lats[finite], side = "right") - 1, 0, len(lat) - 2) // tile_size
+            tiles = tile_rows * ((len(lon) - 2) // tile_size + 1) + tile_cols
+            order = np.argsort(tiles, kind = "stable")
+            for indices in np.split(finite[order], np.flatnonzero(np.diff(tiles[order])) + 1):
+                elevations[indices] = self.sample_window(flat_lons[indices], flat_lats[indices])
+        return self.meters_to_km(self.grid_loader.mask_blanks(elevations.reshape(lons.shape)))
+
+    def surface_elevations(self, lons, lats, profile_x = None, distances = None, elevations = None):
+        """Surface elevation at every event, sampled from the grid at the event coordinates in one windowed call.
+
+        Where the grid has no value at an event (off the grid or on blanked nodes), the elevation of the centerline
+        profile at the Profile_X of the event is used instead, when profile_x, distances and elevations are given.
+
+        Args:
+            lons (array_like): Longitudes of the events.
+            lats (array_like): Latitudes of the events.
+            profile_x (array_like, optional): Distances of the events along the profile (km).
+            distances (ndarray, optional): Distances of the centerline profile (km), from extract_profile.
+            elevations (ndarray, optional): Elevations of the centerline profile (km), from extract_profile.
+
+        Returns:
+            ndarray: Elevations (km), NaN where neither the grid nor the centerline has a value.
+        """
+        lons, lats = np.asarray(lons, dtype = float), np.asarray(lats, dtype = float)
+        if lons.size == 0:
+            return np.empty(lons.shape)
+        surface = self.sample_elevations_windowed(lons, lats)
+        missing = ~np.isfinite(surface)
+        if missing.any() and profile_x is not None and distances is not None:
+            valid = np.isfinite(elevations)
+            if valid.any():
+                surface[missing] = np.interp(np.asarray(profile_x, dtype = float)[missing], distances[valid], elevations[valid])
+        return surface
+
     def extract_profile(self, num_pts = 500):
-        """_summary_
+        """Topographic profile between start_coords and end_coords.
 
         Args:
-            grd_file (_type_): _description_
-            profile_name (_type_): _description_
-            start_coords (_type_): _description_
-            end_coords (_type_): _description_
+            num_pts (int, optional): Number of intervals along the profile. Defaults to 500.
 
         Returns:
-            _type_: _description_
+            tuple: distances (km) and elevations (km), both of shape (num_pts + 1, ).
         """
-        lon, lat, data_km = self.read_grd_ascii(self.grd_file)
-        # Define the interpolator
-        interpolator = RegularGridInterpolator((lat, lon), data_km, bounds_error=False, fill_value=np.nan)
+        vertices = self.vertices if self.vertices is not None else (self.start_coords, self.end_coords)
+        return self.extract_profiles([vertices], num_pts = num_pts)[0]
 
-        # Create a LineString and sample points along the line
-        line = LineString([self.start_coords, self.end_coords])
-        line_points = [line.interpolate(float(i) / num_pts, normalized=True).coords[0] for i in range(num_pts + 1)]
+    def extract_profiles(self, profiles, num_pts = 500):
+        """Topographic profiles for many lines sampled from the same grid in a single interpolator call.
 
-        # Extract elevations
-        elevations = [interpolator((lat, lon)) for lon, lat in line_points]
-        elevations = np.array(elevations)
+        Args:
+            profiles (list): Vertices of every profile in degrees, (start_coords, end_coords) for straight profiles.
+            num_pts (int, optional): Number of intervals along each profile. Defaults to 500.
 
+        Returns:
+            list: One (distances, elevations) tuple per profile, with distances measured by the projection of the
+                profile so they match the Profile_X of the events.
+        """
+        lines = [profile_projection(vertices, method = self.projection).sample_line(num_pts) for vertices in profiles]
+        if not lines:
+            return []
+        lons = np.stack([line_lons for line_lons, _, _ in lines])
+        lats = np.stack([line_lats for _, line_lats, _ in lines])
+        elevations = self.sample_elevations(lons, lats)
         # Return distances and elevations
-        distances = np.linspace(0, 111 * line.length, len(elevations))
-        return distances, elevations
\ No newline at end of file
+        return [(distances, elevations[i]) for i, (_, _, distances) in enumerate(lines)]
+
+    def extract_swath_profile(self, profile_width, num_pts = 500, num_lines = 21, percentiles = (10, 90)):
+        """Topography statistics across the swath of the profile.
+
+        The DEM is sampled on a lattice of num_lines lines parallel to the profile, evenly spread over profile_width,
+        with one windowed interpolation over the whole lattice.
+
+        Args:
+            profile_width (float): Full width of the swath (km).
+            num_pts (int, optional): Number of intervals along the profile. Defaults to 500.
+            num_lines (int, optional): Number of parallel lines across the swath. Defaults to 21.
+            percentiles (tuple, optional): Percentiles computed across the swath. Defaults to (10, 90).
+
+        Returns:
+            dict: distances (km) and the min, mean and max elevations (km) across the swath, all of shape
+                (num_pts + 1, ), and percentiles, a dict of elevations keyed by percentile.
+        """
+        vertices = self.vertices if self.vertices is not None else (self.start_coords, self.end_coords)
+        projection = profile_projection(vertices, method = self.projection)
+        distances = np.linspace(0, projection.length, num_pts + 1)
+        offsets = np.linspace(-profile_width / 2, profile_width / 2, num_lines)[:, np.newaxis]
+        lons, lats = projection.points_at(distances[np.newaxis, :], offsets)
+        elevations = self.sample_elevations_windowed(lons, lats) #(num_lines, num_pts + 1)
+        swath = {"distances": distances, "min": np.full(len(distances), np.nan), "mean": np.full(len(distances), np.nan),
+                 "max": np.full(len(distances), np.nan), "percentiles": {p: np.full(len(distances), np.nan) for p in percentiles}}
+        #Columns where the whole swath is off the grid stay NaN
+        valid = np.isfinite(elevations).any(axis = 0)
+        if valid.any():
+            columns = elevations[:, valid]
+            swath["min"][valid], swath["mean"][valid], swath["max"][valid] = np.nanmin(columns, axis = 0), np.nanmean(columns, axis = 0), np.nanmax(columns, axis = 0)
+            for p in percentiles:
+                swath["percentiles"][p][valid] = np.nanpercentile(columns, p, axis = 0)
+        return swath
@@ -0,0 +1,289 @@
+"""Per-profile pipeline: compute stages that can run in worker processes, and the drawing of each profile"""
+import os, importlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.data_handler import Datahandler
+from utils.spatial_index import Spatialindex
+from utils.catalog_loader import Catalogloader
+from utils.result_cache import Resultcache
+from src.height_profile import Heightprofile
+from src.plotter import VerticalSection
+from src.vector_math import Vectormath
+from utils.instrumentation import run_report, call_with_report
+
+#Catalogs, indexes and grid of the current process, set once per worker by init_worker
+shared_inputs = {}
+#Modules whose code determines the results of compute_profile, hashed into the result cache keys
+result_modules = ("src.pipeline", "src.height_profile", "src.plotter", "src.focal_mechanism", "src.vector_math", "utils.data_handler",
+                  "utils.projection", "utils.spatial_index", "utils.grid_loader", "utils.catalog_loader", "utils.catalog_cache")
+
+def read_profiles(config_point_profiles):
+    """List of profile dictionaries (name, start, end, vertices, width, depth, projection) from the point_profiles section of the config.
+
+    A profile with an entry in profile_vertices follows that polyline, and its start and end are the first and last
+    vertices. Other profiles are the straight segment from profile_start to profile_end.
+    """
+    num_profiles = len(config_point_profiles["profile_start"])
+    projection = config_point_profiles.get("projection", "flat")
+    profile_vertices = config_point_profiles.get("profile_vertices") or [None] * num_profiles
+    profiles = []
+    for i in range(num_profiles):
+        vertices = profile_vertices[i] or [config_point_profiles["profile_start"][i], config_point_profiles["profile_end"][i]]
+        profiles.append({"name": config_point_profiles["profile_name"][i],
+                         "start": vertices[0],
+                         "end": vertices[-1],
+                         "vertices": vertices,
+                         "width": config_point_profiles["profile_width"][i],
+                         "depth": config_point_profiles["profile_depth"][i],
+                         "projection": projection})
+    return profiles
+
+def profile_bounds(profiles, margin = 0.01):
+    """Bounding box (lon_min, lon_max, lat_min, lat_max) in degrees of the swath of every profile, padded by margin."""
+    bounds = []
+    for profile in profiles:
+        datahandler = Datahandler(pd.DataFrame(), profile["start"], profile["end"], projection = profile.get("projection", "flat"), vertices = profile.get("vertices"))
+        bounds.append(datahandler.swath_bounds(profile["width"], margin = margin))
+    return bounds
+
+def grid_bounds(profiles, margin = 0.05):
+    """Union bounding box (lon_min, lon_max, lat_min, lat_max) of the swaths of all profiles, padded by margin degrees.
+
+    Only this window of the DEM is read, so memory follows the study area and not the size of the DEM.
+    """
+    if not profiles:
+        return None
+    bounds = np.array(profile_bounds(profiles, margin = margin))
+    return bounds[:, 0].min(), bounds[:, 1].max(), bounds[:, 2].min(), bounds[:, 3].max()
+
+def input_files(config):
+    """Locations of the earthquake catalog, FMS catalog and DEM of a configuration."""
+    config_data = config["data"]
+    return (os.path.join(config_data["earthquakes_path"], config_data["earthquakes_file"]),
+            os.path.join(config_data["fms_path"], config_data["fms_file"]),
+            os.path.join(config_data["dem_path"], config_data["dem_file"]))
+
+def load_inputs(config, profiles):
+    """Catalogs and DEM location shared by every profile.
+
+    Catalogs are streamed in chunks (or read from the columnar cache), keeping only the needed columns and the events
+    near any profile. A catalog that cannot be read is replaced by an empty DataFrame.
+
+    Returns:
+        tuple: earthquake_data, fms_data and grd_file.
+    """
+    earthquake_file_path, focal_mech_path, grd_file = input_files(config)
+    config_processing = config.get("processing", {})
+    catalog_loader = Catalogloader(chunksize = config_processing.get("chunksize", 500_000), use_cache = config_processing.get("catalog_cache", False))
+    bounds = profile_bounds(profiles)
+    #Earthquake Data
+    try:
+        earthquake_data = catalog_loader.read_earthquakes(earthquake_file_path, bounds = bounds)
+    except Exception as e:
+        print(f"Error loading earthquake data: {e}")
+        earthquake_data = pd.DataFrame()
+    print(f"Total events: {len(earthquake_data)}.")
+    #Focal mechanism data
+    try:
+        fms_data = catalog_loader.read_fms(focal_mech_path, bounds = bounds)
+    except Exception as e:
+        print(f"Error loading focal mechanism data: {e}")
+        fms_data = pd.DataFrame()
+    print(f"Total FMS: {len(fms_data)}.")
+    return earthquake_data, fms_data, grd_file
+
+def result_cache_from_config(config):
+    """Resultcache of the processing.cache_dir folder, or None when the result cache is disabled.
+
+    Its code_version is the hash of the result_modules sources, so results computed by other code are never reused.
+    """
+    cache_dir = config.get("processing", {}).get("cache_dir")
+    if not cache_dir:
+        return None
+    return Resultcache(cache_dir, code_version = Resultcache.source_fingerprint([importlib.import_module(name).__file__ for name in result_modules]))
+
+def run_report_from_config(config):
+    """Turn on the run report of the process when processing.run_report names a JSON file, and return that path (or None)."""
+    config_processing = config.get("processing", {})
+    report_path = config_processing.get("run_report")
+    run_report.configure(bool(report_path), config_processing.get("trace_memory", False))
+    return report_path
+
+def result_settings(config):
+    """Options of the config that change the result of compute_profile, part of the result cache keys."""
+    return {"swath_topography": bool(config.get("figure_parameters", {}).get("swath_topography", False))}
+
+def prepare_inputs(config, profiles, result_cache = None):
+    """Fingerprint the inputs and load the catalogs only for the profiles without a readable cached result.
+
+    Returns:
+        tuple: earthquake_data, fms_data, grd_file and the input fingerprints (None without a result cache).
+    """
+    if result_cache is None:
+        return (*load_inputs(config, profiles), None)
+    fingerprints = result_cache.input_fingerprints(input_files(config))
+    settings = result_settings(config)
+    #A result counts as cached only when it loads, so an unreadable file is recomputed from catalogs that cover its profile
+    pending = [profile for profile in profiles if result_cache.load(result_cache.profile_key(profile, fingerprints, settings)) is None]
+    print(f"Profiles with a cached result: {len(profiles) - len(pending)} of {len(profiles)}.")
+    if not pending:
+        return pd.DataFrame(), pd.DataFrame(), input_files(config)[2], fingerprints
+    return (*load_inputs(config, pending), fingerprints)
+
+def resolve_num_workers(num_workers):
+    """Number of worker processes; None or 0 means one per CPU."""
+    if not num_workers:
+        return os.cpu_count() or 1
+    return int(num_workers)
+
+def init_worker(earthquake_data, fms_data, grd_file, result_cache = None, fingerprints = None, dem_bounds = None, report_options = None, settings = None):
+    """Keep the catalogs in the worker process and build their spatial indexes once. dem_bounds is the window of the DEM to read.
+
+    report_options (enabled, trace_memory) turns on the run report of the process, for workers started with spawn.
+    settings are the result_settings of the run.
+    """
+    if report_options is not None:
+        run_report.configure(*report_options)
+    shared_inputs.clear()
+    shared_inputs["earthquake_data"] = earthquake_data
+    shared_inputs["fms_data"] = fms_data
+    with run_report.stage("spatial_index", rows = len(earthquake_data) + len(fms_data)):
+        shared_inputs["earthquake_index"] = Spatialindex(earthquake_data) if not earthquake_data.empty else None
+        shared_inputs["fms_index"] = Spatialindex(fms_data) if not fms_data.empty else None
+    shared_inputs["grd_file"] = grd_file
+    shared_inputs["grid"] = None
+    shared_inputs["dem_bounds"] = dem_bounds
+    shared_inputs["result_cache"] = result_cache
+    shared_inputs["fingerprints"] = fingerprints
+    shared_inputs["settings"] = settings or {}
+
+def compute_profile(profile):
+    """Compute stages of one profile: swath selection, projection, DEM sampling, topography filter and beachball geometry.
+
+    Args:
+        profile (dict): Profile from read_profiles.
+
+    Returns:
+        dict: Projected earthquakes and FMS, topography (distances, elevations and the swath statistics, None unless
+            the swath_topography setting is on), beachball geometry and event counts.
+    """
+    name, start, end, width, depth = profile["name"], profile["start"], profile["end"], profile["width"], profile["depth"]
+    projection, vertices = profile.get("projection", "flat"), profile.get("vertices")
+    #Earthquake datahandler for this profile
+    earthquake_datahandler = Datahandler(shared_inputs["earthquake_data"], start, end, spatial_index = shared_inputs["earthquake_index"], projection = projection, vertices = vertices)
+    with run_report.stage("select_earthquakes", name) as stage:
+        projected_earthquake_data = earthquake_datahandler.project_onto_profile(width, depth)
+        stage["rows"] = num_events = len(projected_earthquake_data)
+    #FMS datahandler for this profile
+    fms_datahandler = Datahandler(shared_inputs["fms_data"], start, end, spatial_index = shared_inputs["fms_index"], projection = projection, vertices = vertices)
+    with run_report.stage("select_fms", name) as stage:
+        projected_fms_data = Vectormath().classify_fms_data(fms_datahandler.project_onto_profile(width, depth))
+        stage["rows"] = len(projected_fms_data)
+    #Topography for this profile, from the grid loaded once per process
+    height_profile = Heightprofile(shared_inputs["grd_file"], start, end, grid = shared_inputs["grid"], projection = projection, vertices = vertices, bounds = shared_inputs.get("dem_bounds"))
+    with run_report.stage("extract_profile", name) as stage:
+        distances, elevations = height_profile.extract_profile()
+        stage["rows"] = len(distances)
+    swath_topography = None
+    if shared_inputs["settings"].get("swath_topography"):
+        with run_report.stage("extract_swath_profile", name):
+            swath_topography = height_profile.extract_swath_profile(width)
+    shared_inputs["grid"] = height_profile.grid
+    #Sample the DEM at every event and keep the events below the surface
+    with run_report.stage("topography_filter", name) as stage:
+        topo_elevations = height_profile.surface_elevations(projected_earthquake_data["Lon"].values, projected_earthquake_data["Lat"].values,
+                                                            projected_earthquake_data["Profile_X"].values, distances, elevations)
+        projected_earthquake_data["Topo_Elevation"] = topo_elevations
+        projected_earthquake_data["Depth_Below_Surface"] = topo_elevations - projected_earthquake_data["Depth"].values
+        projected_earthquake_data = projected_earthquake_data[~(projected_earthquake_data["Depth_Below_Surface"] <= 0)] #Events without a surface elevation are kept
+        stage["rows"] = len(projected_earthquake_data)
+    #Beachball geometry
+    with run_report.stage("fms_geometry", name) as stage:
+        fms_geometry = VerticalSection().compute_fms_geometry(projected_fms_data)
+        stage["rows"] = len(projected_fms_data)
+    return {"name": name, "projected_earthquake_data": projected_earthquake_data, "projected_fms_data": projected_fms_data,
+            "distances": distances, "elevations": elevations, "swath_topography": swath_topography, "fms_geometry": fms_geometry,
+            "num_events": num_events, "num_fms": len(projected_fms_data), "num_events_filtered": len(projected_earthquake_data)}
+
+def cached_compute_profile(profile):
+    """compute_profile, reusing the result stored in the result cache of the process when the inputs are unchanged."""
+    result_cache = shared_inputs.get("result_cache")
+    if result_cache is None:
+        return compute_profile(profile)
+    key = result_cache.profile_key(profile, shared_inputs["fingerprints"], shared_inputs["settings"])
+    with run_report.stage("load_cached_result", profile["name"]):
+        result = result_cache.load(key)
+    if result is None:
+        result = compute_profile(profile)
+        result_cache.store(key, result)
+    return result
+
+def run_profiles(profiles, earthquake_data, fms_data, grd_file, num_workers = 1, result_cache = None, fingerprints = None, settings = None):
+    """Run compute_profile for every profile, in a process pool when num_workers > 1, with the result_settings of the run.
+
+    With a result cache, profiles whose parameters and input files are unchanged are loaded instead of recomputed.
+    Each process reads only the window of the DEM covering all the profiles (grid_bounds).
+
+    Returns:
+        list: One result of compute_profile per profile, in the order of profiles.
+    """
+    num_workers = min(resolve_num_workers(num_workers), max(len(profiles), 1))
+    initargs = (earthquake_data, fms_data, grd_file, result_cache, fingerprints, grid_bounds(profiles), (run_report.enabled, run_report.trace_memory), settings)
+    if num_workers <= 1:
+        init_worker(*initargs)
+        return [cached_compute_profile(profile) for profile in profiles]
+    with ProcessPoolExecutor(max_workers = num_workers, initializer = init_worker, initargs = initargs) as executor:
+        outputs = list(executor.map(call_with_report, [(cached_compute_profile, profile) for profile in profiles]))
+    for _, records in outputs:
+        run_report.merge(records)
+    return [result for result, _ in outputs]
+
+def print_profile_summary(result):
+    profile_name = result["name"]
+    print(f"     Total events in bounds of profile {str(profile_name)}: {result['num_events']}")
+    print(f"     Total FMS in bounds of profile {str(profile_name)}: {result['num_fms']}")
+    flagged = result["fms_geometry"]["flagged"]
+    if flagged:
+        print(f"     FMS with P/T/B axes inconsistent with their nodal planes in profile {str(profile_name)}: {len(flagged)} (rows {flagged})")
+    print(f"     Total events (filtered) in bounds of profile {profile_name}: {result['num_events_filtered']}\n")
+
+def figure_options(config_figure):
+    """Keyword arguments of draw_profile read from figure_parameters."""
+    return {"swath_topography": config_figure.get("swath_topography", False),
+            "earthquake_rendering": config_figure.get("earthquake_rendering", "auto"),
+            "density_threshold": config_figure.get("density_threshold", VerticalSection.density_threshold),
+            "density_bin_size": config_figure.get("density_bin_size", 1.0),
+            "density_weight": config_figure.get("density_weight", "count")}
+
+def draw_profile(ax, result, profile, swath_topography = False, earthquake_rendering = "auto", density_threshold = VerticalSection.density_threshold, density_bin_size = 1.0, density_weight = "count"):
+    """Draw the topography, earthquakes and focal mechanisms of one computed profile on ax.
+
+    With swath_topography, the min/mean/max and percentile envelopes of the topography across the swath are shaded
+    behind the centerline profile. Earthquakes are drawn as markers, or as a density image of density_bin_size km bins
+    (counts, summed magnitudes or moments per density_weight) for earthquake_rendering "density", or "auto" above
+    density_threshold events.
+    """
+    with run_report.stage("draw_profile", profile["name"]):
+        plotter = VerticalSection()
+        swath = result["swath_topography"] if swath_topography else None
+        if swath is not None:
+            plotter.draw_swath_profile(ax, swath)
+        max_exag_elev = plotter.draw_height_profile(ax, result["distances"], result["elevations"])
+        if swath is not None and np.isfinite(swath["max"]).any():
+            max_exag_elev = max(max_exag_elev, 4 * np.nanmax(swath["max"])) #Same exaggeration as draw_height_profile
+        projected_earthquake_data = result["projected_earthquake_data"]
+        depth_top = max(0.0, float(projected_earthquake_data["Depth"].max())) if len(projected_earthquake_data) else 0.0
+        plotter.draw_earthquakes(ax, projected_earthquake_data, (0.0, float(result["distances"][-1])), (profile["depth"], depth_top), rendering = earthquake_rendering,
+                                 density_threshold = density_threshold, bin_size = density_bin_size, weight = density_weight)
+        with run_report.stage("draw_fms_section", profile["name"], rows = len(result["fms_geometry"]["centers"])):
+            plotter.draw_fms_geometry(ax, result["fms_geometry"])
+        #ax.invert_yaxis()
+        ax.set_ylim(profile["depth"], max_exag_elev)
+        ax.set_aspect('equal')
+        ax.tick_params(axis='both', labelsize=16)
+        ax.set_xlabel("Distance along profile (km)", fontsize = 20)
+        ax.set_ylabel("Depth (km)", fontsize = 20)
+        ax.set_title(profile["name"], fontsize = 25)
+        ax.grid(True)
+        #ax.legend()
@@ -1,9 +1,11 @@
-import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
-from src.focal_mechanism import FocalMechanism
+from src.focal_mechanism import FocalMechanismSet
 
 class VerticalSection():
+    density_threshold = 100_000 #Above this many events, "auto" rendering draws a density image instead of markers
+    density_weights = ("count", "magnitude", "moment")
+
     def __init__(self, depth_bins = None, magnitude_bins = None, colors = None, sizes = None):
         self.depth_bins = depth_bins or [-250, -180, -120, -70, -30, 0]
         self.magnitude_bins = magnitude_bins or [0, 3, 4, 5, 6, 7]
@@ -15,34 +17,122 @@ class VerticalSection():
         projected_earthquake_data["Color"] = pd.cut(projected_earthquake_data["Depth"], bins = self.depth_bins, labels = self.colors, include_lowest=True)
         projected_earthquake_data["Size"] = pd.cut(projected_earthquake_data["Magnitude"], bins = self.magnitude_bins, labels = self.sizes, include_lowest = True).astype(float)
         ax.scatter(projected_earthquake_data["Profile_X"], projected_earthquake_data["Depth"], c = projected_earthquake_data["Color"], s = projected_earthquake_data["Size"], edgecolor = "k", zorder = 0)
+
+    @staticmethod
+    def earthquake_weights(projected_earthquake_data, weight = "count"):
+        """Weight of every event in the density grid: None (each event counts 1), its magnitude or its seismic moment (N m)."""
+        if weight == "count":
+            return None
+        magnitudes = projected_earthquake_data["Magnitude"].to_numpy(dtype = float)
+        if weight == "magnitude":
+            #Negative magnitudes would lower the sum of a cell, and cells summing to 0 or less are not drawn
+            if (magnitudes < 0).any():
+                raise ValueError("The 'magnitude' density weight needs non-negative magnitudes, use 'count' or 'moment' for this catalog.")
+            return magnitudes
+        if weight == "moment":
+            return 10 ** (1.5 * magnitudes + 9.1) #Hanks & Kanamori
+        raise ValueError(f"Unknown density weight {weight!r}, expected one of {VerticalSection.density_weights}.")
+
+    @staticmethod
+    def bin_indices(values, low, high, bin_size, num_bins):
+        """Bin of every value, with values equal to high kept in the last bin."""
+        bins = np.floor((values - low) / bin_size)
+        return np.where(values == high, np.minimum(bins, num_bins - 1), bins)
+
+    def compute_earthquake_density(self, projected_earthquake_data, x_range, depth_range, bin_size = 1.0, weight = "count"):
+        """Events binned on a regular (Profile_X, Depth) grid in one vectorized pass.
+
+        Args:
+            projected_earthquake_data (DataFrame): Projected events with Profile_X, Depth (and Magnitude for weighted grids).
+            x_range (tuple): (min, max) distance along the profile (km).
+            depth_range (tuple): (min, max) depth (km, negative down).
+            bin_size (float, optional): Side of the square bins (km). Defaults to 1.0.
+            weight (str, optional): "count", "magnitude" or "moment". Defaults to "count".
+
+        Returns:
+            tuple: density (num_depth_bins, num_x_bins), with the deepest row first, and the extent
+                (x_min, x_max, depth_min, depth_max) of the grid. Like np.histogram2d, the last bins are closed, so
+                events at x_max or depth_max are counted.
+        """
+        (x_min, x_max), (depth_min, depth_max) = x_range, depth_range
+        num_x = max(int(np.ceil((x_max - x_min) / bin_size)), 1)
+        num_depth = max(int(np.ceil((depth_max - depth_min) / bin_size)), 1)
+        x_bins = self.bin_indices(projected_earthquake_data["Profile_X"].to_numpy(dtype = float), x_min, x_max, bin_size, num_x)
+        depth_bins = self.bin_indices(projected_earthquake_data["Depth"].to_numpy(dtype = float), depth_min, depth_max, bin_size, num_depth)
+        inside = (x_bins >= 0) & (x_bins < num_x) & (depth_bins >= 0) & (depth_bins < num_depth)
+        weights = self.earthquake_weights(projected_earthquake_data, weight)
+        cells = depth_bins[inside].astype(np.int64) * num_x + x_bins[inside].astype(np.int64)
+        density = np.bincount(cells, weights = None if weights is None else weights[inside], minlength = num_x * num_depth)
+        extent = (x_min, x_min + num_x * bin_size, depth_min, depth_min + num_depth * bin_size)
+        return density.reshape(num_depth, num_x).astype(float), extent
+
+    def draw_earthquakes_density(self, ax, projected_earthquake_data, x_range, depth_range, bin_size = 1.0, weight = "count"):
+        """Draws the events as a single log-scaled density image, empty bins left transparent."""
+        from matplotlib.colors import LogNorm
+        density, extent = self.compute_earthquake_density(projected_earthquake_data, x_range, depth_range, bin_size = bin_size, weight = weight)
+        density = np.ma.masked_less_equal(density, 0)
+        if density.count() == 0:
+            return None
+        image = ax.imshow(density, origin = "lower", extent = extent, cmap = "inferno_r", norm = LogNorm(vmin = density.min(), vmax = density.max()),
+                          interpolation = "nearest", aspect = "equal", zorder = 0)
+        labels = {"count": "Events per bin", "magnitude": "Summed magnitude per bin", "moment": "Seismic moment per bin (N m)"}
+        ax.figure.colorbar(image, ax = ax, shrink = 0.6, pad = 0.01).set_label(f"{labels[weight]} ({bin_size:g} km bins)", fontsize = 14)
+        return image
+
+    def draw_earthquakes(self, ax, projected_earthquake_data, x_range, depth_range, rendering = "auto", density_threshold = None, bin_size = 1.0, weight = "count"):
+        """Draws the events as scatter markers or, for "density" or "auto" above density_threshold events, as a density image.
+
+        Returns:
+            str: The rendering used, "scatter" or "density".
+        """
+        if rendering not in ("auto", "scatter", "density"):
+            raise ValueError(f"Unknown earthquake rendering {rendering!r}, expected 'auto', 'scatter' or 'density'.")
+        density_threshold = self.density_threshold if density_threshold is None else density_threshold
+        if rendering == "density" or (rendering == "auto" and len(projected_earthquake_data) > density_threshold):
+            self.draw_earthquakes_density(ax, projected_earthquake_data, x_range, depth_range, bin_size = bin_size, weight = weight)
+            return "density"
+        self.draw_earthquakes_section(ax, projected_earthquake_data)
+        return "scatter"
     #endregion
     #region FMS plots
+    def compute_fms_geometry(self, projected_fms_data, radius = 10):
+        """Beachball polygons of all the focal mechanisms of a section in data coordinates.
+
+        Args:
+            projected_fms_data (DataFrame): Projected FMS with Profile_X, Depth and the plane and axis columns.
+            radius (float, optional): Beachball radius in data units. Defaults to 10.
+
+        Returns:
+            dict: "polygons" (list of (N, 2) arrays relative to their beachball center, shared between mechanisms of the
+            same orientation), "offsets" (center of each polygon), "facecolors" (one per polygon), "centers" (M, 2),
+            "radii" (M, ) and "flagged" (index labels of the mechanisms whose P/T/B axes are inconsistent with their nodal planes).
+        """
+        #projected_fms_data["radius"] = pd.cut(projected_fms_data["Magnitude"], bins = self.magnitude_bins, labels = self.sizes, include_lowest = True).astype(float)
+        return FocalMechanismSet.from_dataframe(projected_fms_data).compute_geometry(radius)
+
+    def draw_fms_geometry(self, ax, fms_geometry):
+        """Draws precomputed beachballs with one collection for the quadrants, one for the outlines and one for the centers."""
+        from matplotlib.collections import PolyCollection, EllipseCollection
+        from matplotlib.transforms import AffineDeltaTransform
+        centers = fms_geometry["centers"]
+        if len(centers) == 0:
+            return
+        ax.scatter(centers[:, 0], centers[:, 1], color = 'k')
+        #Polygons are relative to their center: scaled like the data, then moved to their offset
+        quadrants = PolyCollection(fms_geometry["polygons"], offsets = fms_geometry["offsets"], offset_transform = ax.transData, transform = AffineDeltaTransform(ax.transData),
+                                   facecolors = fms_geometry["facecolors"], edgecolors = "black", zorder = 5)
+        ax.add_collection(quadrants)
+        diameters = 2 * fms_geometry["radii"]
+        outlines = EllipseCollection(diameters, diameters, np.zeros_like(diameters), units = "xy", offsets = centers, offset_transform = ax.transData, facecolors = "none", edgecolors = "black", linewidths = 1)
+        ax.add_collection(outlines)
+
     def draw_fms_section(self, ax, projected_fms_data):
         """Draws the focal mechanisms in a section
 
         Args:
             ax (_type_): _description_
         """
-        #projected_fms_data["radius"] = pd.cut(projected_fms_data["Magnitude"], bins = self.magnitude_bins, labels = self.sizes, include_lowest = True).astype(float)
-        for i, focal_mech in projected_fms_data.iterrows():
-            #radius = focal_mech["radius"]
-            radius = 10
-            center = (focal_mech["Profile_X"], focal_mech["Depth"])
-            strike1 = focal_mech["Strike_1"]
-            dip1 = focal_mech["Dip_1"]
-            rake1 = focal_mech["Rake_1"]
-            strike2 = focal_mech["Strike_2"]
-            dip2 = focal_mech["Dip_2"]
-            rake2 = focal_mech["Rake_2"]
-            P_Az = focal_mech["P_Az"]
-            P_pl = focal_mech["P_pl"]
-            T_Az = focal_mech["T_Az"]
-            T_pl = focal_mech["T_pl"]
-            B_Az = focal_mech["B_Az"]
-            B_pl = focal_mech["B_pl"]
-
-            focal_mechanism = FocalMechanism(radius, center, strike1, dip1, rake1, strike2, dip2, rake2, P_Az, P_pl, T_Az, T_pl, B_Az, B_pl)
-            focal_mechanism.draw_focal_mechanism_filled(ax)
+        self.draw_fms_geometry(ax, self.compute_fms_geometry(projected_fms_data))
     #endregion
     #region Height profile
     def draw_height_profile(self, ax, distances, elevations, vertical_exa = 4):
@@ -55,4 +145,20 @@ class VerticalSection():
         max_exag_elev = exaggerated_elevations[max_id_exa_elev]
         min_exag_elev = exaggerated_elevations[min_id_exa_elev]
         return max_exag_elev
+
+    def draw_swath_profile(self, ax, swath, vertical_exa = 4):
+        """Shade the topography across the swath: min-max envelope, percentile band and mean line.
+
+        Args:
+            ax (Axes): Axes of the section.
+            swath (dict): Output of Heightprofile.extract_swath_profile.
+            vertical_exa (int, optional): Vertical exaggeration, the same as draw_height_profile. Defaults to 4.
+        """
+        distances = swath["distances"]
+        ax.fill_between(distances, vertical_exa * swath["min"], vertical_exa * swath["max"], color = "gray", alpha = 0.25, linewidth = 0, label = "Swath min-max")
+        percentiles = sorted(swath["percentiles"])
+        if len(percentiles) >= 2:
+            low, high = percentiles[0], percentiles[-1]
+            ax.fill_between(distances, vertical_exa * swath["percentiles"][low], vertical_exa * swath["percentiles"][high], color = "gray", alpha = 0.4, linewidth = 0, label = f"Swath P{low}-P{high}")
+        ax.plot(distances, vertical_exa * swath["mean"], color = "dimgray", linestyle = "--", linewidth = 1, label = "Swath mean")
     #endregion
\ No newline at end of file
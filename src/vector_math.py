@@ -1,7 +1,5 @@
 import numpy as np
 from math import pi, radians, degrees, sin, cos, sqrt
-from scipy.spatial.transform import Rotation as R
-import matplotlib.path as mpath
 
 class Vectormath:
     def __init__(self, deg =True):
@@ -61,84 +59,105 @@ class Vectormath:
         #kinematic_vector = self.normalize_vector(kinematic_vector)
         return kinematic_vector
     #endregion
+    #region Batch vectors
+    @staticmethod
+    def convert_deg_to_rad_array(angles, degrees):
+        angles = np.asarray(angles, dtype = float)
+        if degrees:
+            return np.radians(angles)
+        return angles
+
+    def compute_strike_vectors(self, strike_angles):
+        """Array version of compute_strike_vector. Takes N strikes and returns an (N, 3) array."""
+        strike = self.convert_deg_to_rad_array(strike_angles, self.deg)
+        return np.column_stack((np.sin(strike), np.cos(strike), np.zeros_like(strike)))
+
+    def compute_dip_vectors(self, strike_angles, dip_angles):
+        """Array version of compute_dip_vector. Takes N strikes and dips and returns an (N, 3) array."""
+        strike = self.convert_deg_to_rad_array(strike_angles, self.deg)
+        dip = self.convert_deg_to_rad_array(dip_angles, self.deg)
+        return np.column_stack((np.cos(strike) * np.cos(dip), -np.sin(strike) * np.cos(dip), -np.sin(dip) * np.ones_like(strike)))
+
+    def compute_rake_vectors(self, strike_angles, dip_angles, rake_angles):
+        """Array version of compute_rake_vector. Takes N strikes, dips and rakes and returns an (N, 3) array."""
+        strike_vectors = self.compute_strike_vectors(strike_angles)
+        dip_vectors = self.compute_dip_vectors(strike_angles, dip_angles)
+        rake = self.convert_deg_to_rad_array(rake_angles, self.deg)[:, np.newaxis]
+        return np.cos(rake) * strike_vectors + np.sin(rake) * dip_vectors
+
+    def compute_normal_vectors(self, strike_angles, dip_angles):
+        """Array version of compute_normal_vector. Takes N strikes and dips and returns an (N, 3) array."""
+        strike_vectors = self.compute_strike_vectors(strike_angles)
+        dip_vectors = self.compute_dip_vectors(strike_angles, dip_angles)
+        return np.cross(dip_vectors, strike_vectors)
+
+    def compute_kinematic_vectors(self, kinematic_azimuths, kinematic_plunges):
+        """Array version of compute_kinematic_vector. Takes N azimuths and plunges and returns an (N, 3) array."""
+        azimuth = self.convert_deg_to_rad_array(kinematic_azimuths, self.deg)
+        plunge = self.convert_deg_to_rad_array(kinematic_plunges, self.deg)
+        return np.column_stack((np.sin(azimuth) * np.cos(plunge), np.cos(azimuth) * np.cos(plunge), -np.sin(plunge)))
+
+    def compute_fms_vectors(self, fms_data):
+        """All the vectors of an FMS table in one call per vector type.
+
+        Args:
+            fms_data (DataFrame): Table with the Strike_1/Dip_1/Rake_1, Strike_2/Dip_2/Rake_2 and P/T/B axis columns.
+
+        Returns:
+            dict: (N, 3) arrays keyed by "S1", "D1", "R1", "N1", "S2", "D2", "R2", "N2", "P", "T" and "B".
+        """
+        vectors = {}
+        for plane in ("1", "2"):
+            strike, dip, rake = fms_data[f"Strike_{plane}"].values, fms_data[f"Dip_{plane}"].values, fms_data[f"Rake_{plane}"].values
+            vectors[f"S{plane}"] = self.compute_strike_vectors(strike)
+            vectors[f"D{plane}"] = self.compute_dip_vectors(strike, dip)
+            vectors[f"R{plane}"] = self.compute_rake_vectors(strike, dip, rake)
+            vectors[f"N{plane}"] = self.compute_normal_vectors(strike, dip)
+        for axis in ("P", "T", "B"):
+            vectors[axis] = self.compute_kinematic_vectors(fms_data[f"{axis}_Az"].values, fms_data[f"{axis}_pl"].values)
+        return vectors
+    #endregion
     #region Step 1: Plane circle
-    def sort_pts_by_angle(self, points, D, S):
-        u = self.normalize_vector(D)
-        v = self.normalize_vector(S)
-        normal_vec = np.cross(u, v)
-        normal_vec = self.normalize_vector(normal_vec)
-        #Project onto plane
-        coords = points[:3, :] #Only (x, y, z). Shape (3, N).
-        flags = points[3, :] #The flag row. Shape (N, ).
-        points_proj = coords - np.outer(normal_vec, np.dot(normal_vec, coords))
-        #Convert to local x', y' coordinates
-        p_u = np.dot(u, points_proj)
-        p_v = np.dot(v, points_proj)
-        #Compute clockwise angle from v
-        theta = np.arctan2(p_u, p_v)
-
-        def normalize_angle(angle):
-            tolerance = 1e-10
-            angle = angle % (2 * pi)
-            angle = np.where(np.isclose(angle, 2 * pi), 0.0, angle) #Leave other values unchanged
-            angle = np.where(np.isclose(angle, 0.0), 0.0, angle)
-            angle = np.where(np.isclose(angle, pi), pi, angle)
-            angle = np.where(np.isclose(angle, pi + tolerance), pi, angle)
-            return angle
-
-        normal_theta = normalize_angle(theta)
-
-        sorted_indices = np.argsort(normal_theta)
-        #sorted_pts = points[:, sorted_indices]
-        sorted_coords = coords[:, sorted_indices]
-        sorted_flags = flags[sorted_indices]
-        sorted_pts = np.vstack((sorted_coords, sorted_flags))
-        return sorted_pts
-    
-    def point_exists(self, array, point):
-        return np.any(np.all(np.isclose(array.T, point.T), axis=1))
-    
+    def generate_plane_arcs(self, strikes, dips, B_azimuths, B_plunges, num_pts = 50, radius = 1.0):
+        """Lower-hemisphere arcs of N nodal planes, parametrized directly from their strike and dip vectors.
+
+        The arc of each plane is cos(t) * S + sin(t) * D for t in [0, pi], which runs from S through the dip vector to -S
+        and never leaves the lower hemisphere. The samples are split between [0, t_B] and [t_B, pi], where t_B is the
+        angle of the B axis in the plane, and the sample at t_B is replaced by B itself so that both nodal planes of a
+        mechanism meet exactly at B.
+
+        Args:
+            strikes, dips, B_azimuths, B_plunges (array_like): N plane and B axis angles.
+            num_pts (int, optional): Points per arc, including S, B and -S. Defaults to 50.
+            radius (float, optional): Radius of the sphere. Defaults to 1.0.
+
+        Returns:
+            ndarray: Array of shape (N, 4, num_pts) holding x, y, z and a flag row (1 at B, 0 elsewhere), ordered from S to -S.
+        """
+        if num_pts < 3:
+            raise ValueError("An arc needs at least 3 points (S, B and -S).")
+        S = self.compute_strike_vectors(strikes)
+        D = self.compute_dip_vectors(strikes, dips)
+        B = self.compute_kinematic_vectors(B_azimuths, B_plunges)
+        B = np.where(B[:, 2:3] > 0, -B, B) #B as a lower-hemisphere axis
+        #Angle of B in the plane, measured from S towards D
+        t_B = np.clip(np.arctan2(np.sum(B * D, axis = 1), np.sum(B * S, axis = 1)), 0, pi)
+        b_index = np.clip(np.rint((num_pts - 1) * t_B / pi), 1, num_pts - 2).astype(int)
+        k = np.arange(num_pts)[np.newaxis, :]
+        b = b_index[:, np.newaxis]
+        t = np.where(k <= b, t_B[:, np.newaxis] * k / b, t_B[:, np.newaxis] + (pi - t_B[:, np.newaxis]) * (k - b) / (num_pts - 1 - b))
+        points = np.cos(t)[:, :, np.newaxis] * S[:, np.newaxis, :] + np.sin(t)[:, :, np.newaxis] * D[:, np.newaxis, :]
+        rows = np.arange(len(S))
+        points[:, 0] = S
+        points[:, -1] = -S
+        points[rows, b_index] = B
+        flags = np.zeros((len(S), 1, num_pts))
+        flags[rows, 0, b_index] = 1
+        return np.concatenate((radius * points.transpose(0, 2, 1), flags), axis = 1)
+
     def generate_plane_circle(self, strike, dip, B_azimuth, B_plunge, num_pts = 50, radius = 1.0):
-        phi = np.linspace(0, 2 * np.pi, num_pts) #Radians
-        circle = np.array([np.cos(phi), np.sin(phi), np.zeros_like(phi)])  # Circle in XY plane
-
-        # Align the circle with the fault plane normal
-        z_axis = np.array([0, 0, 1])
-        normal_vector = self.compute_normal_vector(strike, dip)
-        normal_vector = self.normalize_vector(normal_vector)
-        rotation, _ = R.align_vectors([normal_vector], [z_axis])
-        rotated_circle = rotation.apply(circle.T).T
-        nodal_plane = radius * rotated_circle
-
-        #Filter below the equator
-        mask = nodal_plane[2] <= 0
-        nodal_plane_below_equator = nodal_plane[:, mask]
-
-        #Remove last point as it is the same as first point
-        if np.allclose(nodal_plane_below_equator[:, 0], nodal_plane_below_equator[:, -1]):
-            nodal_plane_below_equator = nodal_plane_below_equator[:, :-1]
-
-        #Add a flag to the points
-        flags = np.zeros((1, nodal_plane_below_equator.shape[1])) #Initialize to 0
-        nodal_plane_flags = np.vstack((nodal_plane_below_equator, flags))
-        #Add the mandatory points (S and B).
-        S = self.compute_strike_vector(strike)
-        strike_pt = S[:, np.newaxis]
-        strike_pt = np.vstack((strike_pt, [[0]])) #S flag is set to zero
-        if not self.point_exists(nodal_plane_flags, strike_pt):
-            nodal_plane_flags = np.concatenate((nodal_plane_flags, strike_pt), axis = 1)
-        if not self.point_exists(nodal_plane_flags, -strike_pt):
-            nodal_plane_flags = np.concatenate((nodal_plane_flags, -strike_pt), axis = 1)
-        B = self.compute_kinematic_vector(B_azimuth, B_plunge)
-        B_pt = B[:, np.newaxis]
-        B_pt = np.vstack((B_pt, [[1]])) #B flag is set to one
-        if not self.point_exists(nodal_plane_flags, B_pt):
-            nodal_plane_flags = np.concatenate((nodal_plane_flags, B_pt), axis = 1)
-
-        D = self.compute_dip_vector(strike, dip)
-        nodal_plane_sorted = self.sort_pts_by_angle(nodal_plane_flags, D, S)
-
-        return nodal_plane_sorted
+        """Lower-hemisphere arc of one nodal plane as a (4, num_pts) array ordered from S through B to -S."""
+        return self.generate_plane_arcs([strike], [dip], [B_azimuth], [B_plunge], num_pts = num_pts, radius = radius)[0]
     #endregion
     #region Step 2: Project
     def lambert_projection(self, x, y, z):
@@ -234,6 +253,135 @@ class Vectormath:
     
     def point_in_polygon(self, point, polygon):
         """Check if a point is inside a polygon using matplotlib Path."""
+        import matplotlib.path as mpath
         path = mpath.Path(np.column_stack((polygon[0], polygon[1])))
         return path.contains_point(point)
-    #endregion
\ No newline at end of file
+    #endregion
+    #region Polarity
+    @staticmethod
+    def quadrant_sign(vectors, normals1, normals2):
+        """+1 or -1 for the pair of opposite quadrants a vector falls in, 0 on a nodal plane. Works on (..., 3) arrays."""
+        return np.sign(np.sum(vectors * normals1, axis = -1)) * np.sign(np.sum(vectors * normals2, axis = -1))
+
+    def classify_polarity(self, directions, normals1, normals2, T_vectors, P_vectors = None):
+        """Closed-form quadrant polarity from sign tests on dot products with the nodal-plane normals.
+
+        A direction is compressional (same quadrants as the T axis, filled in the beachball) when the product of the
+        signs of its dot products with both normals equals that of T. If T lies on a nodal plane the P axis is used,
+        with the opposite sign.
+
+        Args:
+            directions (ndarray): Directions to classify, shape (N, 3) or (N, K, 3).
+            normals1, normals2 (ndarray): Nodal-plane normals, shape (N, 3).
+            T_vectors (ndarray): T axes, shape (N, 3).
+            P_vectors (ndarray, optional): P axes, shape (N, 3), used where T is on a nodal plane.
+
+        Returns:
+            ndarray: Boolean array with the shape of directions without its last axis (True for compressional).
+        """
+        reference_sign = self.quadrant_sign(T_vectors, normals1, normals2)
+        if P_vectors is not None:
+            reference_sign = np.where(reference_sign == 0, -self.quadrant_sign(P_vectors, normals1, normals2), reference_sign)
+        if directions.ndim == 3:
+            normals1, normals2, reference_sign = normals1[:, np.newaxis], normals2[:, np.newaxis], reference_sign[:, np.newaxis]
+        direction_sign = self.quadrant_sign(directions, normals1, normals2)
+        return (direction_sign == reference_sign) & (direction_sign != 0)
+
+    def check_axes_consistency(self, normals1, normals2, P_vectors, T_vectors, B_vectors, tolerance = 10.0):
+        """Flags mechanisms whose P/T/B axes do not agree with their nodal planes.
+
+        A row is flagged when the planes are not perpendicular, B is not on both planes, T or P is on a nodal plane, or
+        T and P do not fall in opposite quadrants, all within tolerance degrees.
+
+        Returns:
+            ndarray: Boolean array of shape (N, ), True for inconsistent rows.
+        """
+        limit = np.sin(np.radians(tolerance))
+        flagged = np.abs(np.sum(normals1 * normals2, axis = 1)) > limit
+        for normals in (normals1, normals2):
+            flagged |= np.abs(np.sum(B_vectors * normals, axis = 1)) > limit
+            flagged |= np.abs(np.sum(T_vectors * normals, axis = 1)) < limit
+            flagged |= np.abs(np.sum(P_vectors * normals, axis = 1)) < limit
+        flagged |= self.quadrant_sign(T_vectors, normals1, normals2) != -self.quadrant_sign(P_vectors, normals1, normals2)
+        return flagged
+
+    def check_fms_consistency(self, fms_data, tolerance = 10.0):
+        """check_axes_consistency for a whole FMS table. Returns a boolean array, True for inconsistent rows."""
+        vectors = self.compute_fms_vectors(fms_data)
+        return self.check_axes_consistency(vectors["N1"], vectors["N2"], vectors["P"], vectors["T"], vectors["B"], tolerance = tolerance)
+    #endregion
+    #region Classification
+    #Plunge thresholds (degrees) of Frohlich (1992) and rake limits of the rake-based style
+    frohlich_thrust_plunge = 50.0
+    frohlich_normal_plunge = 60.0
+    frohlich_strike_slip_plunge = 60.0
+    rake_strike_slip_limit = 30.0
+
+    def compute_ternary_fractions(self, P_plunges, T_plunges, B_plunges):
+        """Frohlich/Kaverina ternary fractions from the plunges of the P, T and B axes.
+
+        Returns:
+            tuple: Thrust (sin² of T plunge), normal (sin² of P plunge) and strike-slip (sin² of B plunge) fractions,
+                (N, ) arrays that add up to 1 for orthogonal axes.
+        """
+        return tuple(np.sin(self.convert_deg_to_rad_array(plunges, self.deg)) ** 2 for plunges in (T_plunges, P_plunges, B_plunges))
+
+    def classify_frohlich(self, P_plunges, T_plunges, B_plunges):
+        """Frohlich class of each mechanism: "thrust", "normal", "strike-slip" or "odd" when no axis is steep enough."""
+        P_plunges, T_plunges, B_plunges = (np.degrees(self.convert_deg_to_rad_array(plunges, self.deg)) for plunges in (P_plunges, T_plunges, B_plunges))
+        conditions = [T_plunges > self.frohlich_thrust_plunge, P_plunges > self.frohlich_normal_plunge, B_plunges > self.frohlich_strike_slip_plunge]
+        return np.select(conditions, ["thrust", "normal", "strike-slip"], default = "odd")
+
+    def classify_rake_style(self, rake_angles):
+        """Rake-based style: "strike-slip" within rake_strike_slip_limit degrees of horizontal slip, otherwise "reverse"
+        for positive rakes and "normal" for negative ones."""
+        rakes = (np.degrees(self.convert_deg_to_rad_array(rake_angles, self.deg)) + 180.0) % 360.0 - 180.0
+        strike_slip = (np.abs(rakes) <= self.rake_strike_slip_limit) | (np.abs(rakes) >= 180.0 - self.rake_strike_slip_limit)
+        return np.select([strike_slip, rakes > 0], ["strike-slip", "reverse"], default = "normal")
+
+    def compute_slip_vectors(self, strike_angles, dip_angles, rake_angles):
+        """Slip vectors in the Aki & Richards convention (positive rake slips up-dip), an (N, 3) array.
+
+        compute_rake_vectors rotates towards the down-dip vector instead, so it is not used to compare the planes.
+        """
+        strike_vectors = self.compute_strike_vectors(strike_angles)
+        dip_vectors = self.compute_dip_vectors(strike_angles, dip_angles)
+        rake = self.convert_deg_to_rad_array(rake_angles, self.deg)[:, np.newaxis]
+        return np.cos(rake) * strike_vectors - np.sin(rake) * dip_vectors
+
+    def compute_plane_misfit(self, fms_data):
+        """Angle in degrees between the slip vector of each nodal plane and the normal of the other plane.
+
+        Args:
+            fms_data (DataFrame): Table with the Strike_1/Dip_1/Rake_1 and Strike_2/Dip_2/Rake_2 columns.
+
+        Returns:
+            ndarray: (N, ) largest of the two angles; 0 for a perfectly consistent pair of planes.
+        """
+        slips, normals = {}, {}
+        for plane in ("1", "2"):
+            strike, dip, rake = fms_data[f"Strike_{plane}"].values, fms_data[f"Dip_{plane}"].values, fms_data[f"Rake_{plane}"].values
+            slips[plane] = self.compute_slip_vectors(strike, dip, rake)
+            normals[plane] = self.compute_normal_vectors(strike, dip)
+        misfits = [np.degrees(np.arccos(np.clip(np.abs(np.sum(slips[plane] * normals[other], axis = 1)), 0.0, 1.0)))
+                   for plane, other in (("1", "2"), ("2", "1"))]
+        return np.maximum(*misfits)
+
+    def classify_fms_data(self, fms_data, tolerance = 10.0):
+        """Derived quantities of a whole FMS table, added as new columns in one pass.
+
+        Args:
+            fms_data (DataFrame): Table with the nodal plane and P/T/B axis columns.
+            tolerance (float, optional): Largest plane misfit (degrees) of a consistent mechanism. Defaults to 10.0.
+
+        Returns:
+            DataFrame: Copy of fms_data with the Thrust_Fraction, Normal_Fraction, Strike_Slip_Fraction, Frohlich_Class,
+                Rake_Style, Plane_Misfit and Planes_Consistent columns.
+        """
+        thrust_fraction, normal_fraction, strike_slip_fraction = self.compute_ternary_fractions(fms_data["P_pl"].values, fms_data["T_pl"].values, fms_data["B_pl"].values)
+        plane_misfit = self.compute_plane_misfit(fms_data)
+        return fms_data.assign(Thrust_Fraction = thrust_fraction, Normal_Fraction = normal_fraction, Strike_Slip_Fraction = strike_slip_fraction,
+                               Frohlich_Class = self.classify_frohlich(fms_data["P_pl"].values, fms_data["T_pl"].values, fms_data["B_pl"].values),
+                               Rake_Style = self.classify_rake_style(fms_data["Rake_1"].values),
+                               Plane_Misfit = plane_misfit, Planes_Consistent = plane_misfit <= tolerance)
+    #endregion
@@ -0,0 +1,32 @@
+import json
+import numpy as np
+from benchmarks.synthetic_data import synthetic_fms, write_dsaa
+from benchmarks.run_benchmarks import main
+from src.vector_math import Vectormath
+from utils.grid_loader import Gridloader
+
+def test_synthetic_fms_is_consistent():
+    fms_data = synthetic_fms(200)
+    assert not Vectormath().check_fms_consistency(fms_data).any()
+    assert np.nanmax(Vectormath().compute_plane_misfit(fms_data)) < 0.1
+
+def test_write_dsaa_shape(tmp_path):
+    grd_file = str(tmp_path / "dem.grd")
+    write_dsaa(grd_file, 30, 20, block_rows = 7)
+    lon, lat, data = Gridloader(use_cache = False).load(grd_file)
+    assert data.shape == (20, 30) and len(lon) == 30 and len(lat) == 20
+
+def test_benchmark_run_writes_every_stage(tmp_path):
+    output = str(tmp_path / "results.json")
+    assert main(["--sizes", "200", "--fms-size", "20", "--loop-limit", "5", "--grid", "40", "30", "--repeat", "1", "--output", output, "--workdir", str(tmp_path)]) == 0
+    with open(output) as f:
+        report = json.load(f)
+    stages = {entry["stage"] for entry in report["results"]}
+    assert {"csv_load", "filter_pts", "project_onto_profile", "read_grd_ascii", "extract_profile", "generate_plane_circle", "construct_quadrants", "render_section"} <= stages
+    assert all(entry["best"] <= entry["median"] for entry in report["results"])
+    main(["--sizes", "200", "--fms-size", "20", "--loop-limit", "5", "--grid", "40", "30", "--repeat", "1", "--output", str(tmp_path / "again.json"), "--workdir", str(tmp_path), "--compare", output])
+
+def test_entry_points_do_not_import_plotting_or_scipy():
+    from benchmarks.import_time import module_report
+    for module in ("src.cli", "src.pipeline", "src.height_profile", "src.focal_mechanism"):
+        assert module_report(module, repeat = 1)["unexpected_imports"] == []
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+import pandas as pd
+from utils.catalog_loader import Catalogloader
+from benchmarks.synthetic_data import synthetic_fms
+
+def write_catalog(path, num_events = 1000, seed = 2):
+    rng = np.random.default_rng(seed)
+    catalog = pd.DataFrame({"OBJECTID": np.arange(num_events), "fecha": "2012-01-16", "Lat": rng.uniform(5, 15, num_events), "Lon": rng.uniform(-80, -70, num_events),
+                            "Depth": -rng.uniform(0, 250, num_events).round(2), "Magnitude": rng.uniform(1, 6, num_events).round(1)})
+    catalog.to_csv(path, sep = ";", index = False)
+    return catalog
+
+def test_read_earthquakes_in_chunks_with_bounds(tmp_path):
+    file_path = os.path.join(tmp_path, "earthquakes.csv")
+    catalog = write_catalog(file_path)
+    bounds = [(-75.0, -72.0, 8.0, 11.0), (-71.0, -70.0, 14.0, 15.0)]
+    earthquake_data = Catalogloader(chunksize = 97).read_earthquakes(file_path, bounds = bounds)
+    expected = catalog[Catalogloader.in_bounds(catalog, bounds)]
+    assert list(earthquake_data.columns) == ["Lon", "Lat", "Depth", "Magnitude"]
+    assert earthquake_data["Depth"].dtype == np.float32 and earthquake_data["Lon"].dtype == np.float64
+    assert len(earthquake_data) == len(expected) > 0
+    assert np.array_equal(earthquake_data["Lon"].values, expected["Lon"].values)
+
+def test_read_catalog_missing_columns(tmp_path):
+    file_path = os.path.join(tmp_path, "earthquakes.csv")
+    write_catalog(file_path)
+    try:
+        Catalogloader().read_fms(file_path)
+    except ValueError as e:
+        assert "Dataset must contain the columns" in str(e)
+    else:
+        raise AssertionError("Missing FMS columns were not reported.")
+
+def test_catalog_cache_reused_until_source_changes(tmp_path):
+    file_path = os.path.join(tmp_path, "earthquakes.csv")
+    write_catalog(file_path)
+    bounds = [(-75.0, -72.0, 8.0, 11.0)]
+    streamed = Catalogloader().read_earthquakes(file_path, bounds = bounds)
+    cached_loader = Catalogloader(use_cache = True)
+    first = cached_loader.read_earthquakes(file_path, bounds = bounds)
+    assert os.path.exists(os.path.join(file_path + ".cache", "schema.json"))
+    full = cached_loader.read_earthquakes(file_path)
+    assert isinstance(full["Lon"].values, np.memmap)
+    pd.testing.assert_frame_equal(first, streamed)
+    write_catalog(file_path, num_events = 10, seed = 3)
+    assert len(cached_loader.read_earthquakes(file_path)) == 10
+
+def test_cached_text_columns_keep_missing_values(tmp_path):
+    file_path = os.path.join(tmp_path, "fms.csv")
+    fms_data = synthetic_fms(50)
+    fms_data.loc[[3, 7], "Date"] = np.nan
+    fms_data.loc[5, "Time_GMT"] = np.nan
+    fms_data.to_csv(file_path, sep = ";", index = False)
+    streamed = Catalogloader().read_fms(file_path)
+    Catalogloader(use_cache = True).read_fms(file_path)
+    cached = Catalogloader(use_cache = True).read_fms(file_path)
+    assert cached["Date"].isna().sum() == 2 and cached["Time_GMT"].isna().sum() == 1
+    pd.testing.assert_frame_equal(cached, streamed)
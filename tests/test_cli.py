@@ -0,0 +1,83 @@
+import os
+from benchmarks.synthetic_data import synthetic_earthquakes, synthetic_fms, write_catalog, write_dsaa
+from src.cli import parse_args, plan_pages, file_label, render
+from utils.result_cache import Resultcache
+
+def test_plan_pages_per_profile_and_pages():
+    profiles = [{"name": name} for name in ["AA'", "BB'", "CC'", "DD'", "EE'"]]
+    per_profile = plan_pages(profiles, "per-profile", 2, "out", "section", "png")
+    assert [path for _, path in per_profile][0] == os.path.join("out", "section_001_AA.png")
+    assert all(len(page_profiles) == 1 for page_profiles, _ in per_profile)
+    pages = plan_pages(profiles, "pages", 2, "out", "section", "pdf")
+    assert [len(page_profiles) for page_profiles, _ in pages] == [2, 2, 1]
+    assert pages[-1][1] == os.path.join("out", "section_page_003.pdf")
+    assert file_label("A/B 'x'") == "A_B_x"
+
+def test_parse_args_defaults():
+    args = parse_args(["--mode", "pages", "--dpi", "150"])
+    assert args.config == "config.json" and args.mode == "pages" and args.dpi == 150 and args.workers is None
+
+def synthetic_config(tmp_path):
+    write_catalog(synthetic_earthquakes(2000), os.path.join(tmp_path, "earthquakes.csv"))
+    write_catalog(synthetic_fms(20), os.path.join(tmp_path, "fms.csv"))
+    write_dsaa(os.path.join(tmp_path, "dem.grd"), 120, 80)
+    return {"data": {"earthquakes_path": str(tmp_path), "earthquakes_file": "earthquakes.csv", "fms_path": str(tmp_path), "fms_file": "fms.csv",
+                     "dem_path": str(tmp_path), "dem_file": "dem.grd"},
+            "point_profiles": {"profile_name": ["AA'", "BB'"], "profile_start": [[-79.0, 12.5], [-78.0, 8.0]], "profile_end": [[-71.0, 8.5], [-72.0, 13.0]],
+                               "profile_width": [100.0, 100.0], "profile_depth": [-250.0, -250.0]},
+            "figure_parameters": {"swath_topography": False, "earthquake_rendering": "scatter"},
+            "processing": {"cache_dir": os.path.join(tmp_path, "result_cache")}}
+
+def test_render_skips_up_to_date_files(tmp_path):
+    config = synthetic_config(tmp_path)
+    output_dir = os.path.join(tmp_path, "figures")
+    written = render(config, output_dir, "section", dpi = 30, num_workers = 1)
+    assert len(written) == 2 and all(os.path.getsize(path) > 0 for path in written)
+    assert render(config, output_dir, "section", dpi = 30, num_workers = 1) == []
+    #A figure option changes the files but not the cached results
+    config["figure_parameters"]["earthquake_rendering"] = "density"
+    assert render(config, output_dir, "section", dpi = 30, num_workers = 1) == written
+
+def test_swath_topography_computed_only_when_drawn(tmp_path):
+    config = synthetic_config(tmp_path)
+    output_dir, cache_dir = os.path.join(tmp_path, "figures"), config["processing"]["cache_dir"]
+    def cached_swaths():
+        return [Resultcache(cache_dir).load(file_name[:-len(".pkl")])["swath_topography"] for file_name in os.listdir(cache_dir) if file_name.endswith(".pkl")]
+    render(config, output_dir, "section", dpi = 30, num_workers = 1)
+    assert cached_swaths() == [None, None]
+    #The option is part of the result keys, so turning it on computes the swaths
+    config["figure_parameters"]["swath_topography"] = True
+    assert len(render(config, output_dir, "section", dpi = 30, num_workers = 1)) == 2
+    swaths = [swath for swath in cached_swaths() if swath is not None]
+    assert len(swaths) == 2 and all(len(swath["mean"]) == len(swath["distances"]) for swath in swaths)
+
+def test_report_rows_follow_the_topography_filter(tmp_path):
+    from utils.instrumentation import run_report
+    config = synthetic_config(tmp_path)
+    earthquake_data = synthetic_earthquakes(2000)
+    earthquake_data.loc[::10, "Depth"] = 5.0 #Above the DEM
+    write_catalog(earthquake_data, os.path.join(tmp_path, "earthquakes.csv"))
+    run_report.configure(True)
+    try:
+        render(config, os.path.join(tmp_path, "figures"), "section", dpi = 30, num_workers = 1)
+        records = run_report.drain()
+    finally:
+        run_report.configure(False)
+    cache_dir = config["processing"]["cache_dir"]
+    results = [Resultcache(cache_dir).load(file_name[:-len(".pkl")]) for file_name in os.listdir(cache_dir) if file_name.endswith(".pkl")]
+    filtered = {result["name"]: result["num_events_filtered"] for result in results}
+    assert {record["profile"]: record["rows"] for record in records if record["stage"] == "topography_filter"} == filtered
+    assert any(result["num_events_filtered"] < result["num_events"] for result in results)
+
+def test_unreadable_cached_result_is_recomputed_from_its_catalogs(tmp_path):
+    config = synthetic_config(tmp_path)
+    output_dir, cache_dir = os.path.join(tmp_path, "figures"), config["processing"]["cache_dir"]
+    render(config, output_dir, "section", dpi = 30, num_workers = 1)
+    def cached_counts():
+        return sorted((result["name"], result["num_events"]) for result in (Resultcache(cache_dir).load(file_name[:-len(".pkl")]) for file_name in os.listdir(cache_dir) if file_name.endswith(".pkl")) if result is not None)
+    counts = cached_counts()
+    assert all(num_events > 0 for _, num_events in counts)
+    with open(os.path.join(cache_dir, sorted(file_name for file_name in os.listdir(cache_dir) if file_name.endswith(".pkl"))[0]), 'wb') as f:
+        f.write(b"truncated")
+    assert len(render(config, output_dir, "section", dpi = 30, num_workers = 1, force = True)) == 2
+    assert cached_counts() == counts
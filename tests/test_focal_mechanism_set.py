@@ -0,0 +1,85 @@
+import numpy as np
+from matplotlib.figure import Figure
+from benchmarks.synthetic_data import synthetic_fms
+from src.focal_mechanism import FocalMechanism, FocalMechanismSet
+from src.plotter import VerticalSection
+
+def projected_fms(num_mechanisms):
+    fms_data = synthetic_fms(num_mechanisms)
+    fms_data.index = fms_data.index + 100
+    return fms_data.assign(Profile_X = np.linspace(0, 500, num_mechanisms))
+
+def test_set_is_float32_and_slices():
+    fms_data = projected_fms(50)
+    fms_set = FocalMechanismSet.from_dataframe(fms_data)
+    assert len(fms_set) == 50 and fms_set.angles.dtype == np.float32 and fms_set.angles.shape == (12, 50)
+    assert fms_set.nbytes <= 50 * (12 * 4 + 2 * 4 + 8)
+    np.testing.assert_allclose(fms_set.column("T_pl"), fms_data["T_pl"], atol = 1e-4)
+    mask = fms_data["Dip_1"].values > 45
+    subset = fms_set[mask]
+    assert len(subset) == mask.sum() and list(subset.index) == list(fms_data.index[mask])
+    assert len(fms_set[10:20]) == 10 and fms_set[3].index.tolist() == [103]
+    np.testing.assert_allclose(subset.centers[:, 0], fms_data["Profile_X"].values[mask], atol = 1e-4)
+
+def test_geometry_matches_per_mechanism_templates():
+    fms_data = projected_fms(40)
+    geometry = FocalMechanismSet.from_dataframe(fms_data).compute_geometry(radius = 10)
+    polygons, facecolors = [], []
+    for row in fms_data.itertuples():
+        focal_mechanism = FocalMechanism(10, (row.Profile_X, row.Depth), row.Strike_1, row.Dip_1, row.Rake_1, row.Strike_2, row.Dip_2, row.Rake_2,
+                                         row.P_Az, row.P_pl, row.T_Az, row.T_pl, row.B_Az, row.B_pl)
+        unit_polygons, fill_pattern = focal_mechanism.get_unit_template()
+        polygons.extend((10 * unit_polygon).T + (row.Profile_X, row.Depth) for unit_polygon in unit_polygons)
+        facecolors.extend("black" if filled else "white" for filled in fill_pattern)
+    assert len(geometry["polygons"]) == len(polygons) == len(geometry["offsets"]) and geometry["facecolors"] == facecolors
+    for polygon, offset, expected in zip(geometry["polygons"], geometry["offsets"], polygons):
+        np.testing.assert_allclose(polygon + offset, expected, atol = 1e-3)
+    assert geometry["flagged"] == []
+
+def test_shared_orientations_share_polygons_and_flag_inconsistent_axes():
+    fms_data = projected_fms(5)
+    fms_data = fms_data.iloc[[0, 1, 0, 1, 0]].assign(Profile_X = np.arange(5.0))
+    fms_data.iloc[4, fms_data.columns.get_loc("T_pl")] = fms_data["P_pl"].iloc[4]
+    fms_data.iloc[4, fms_data.columns.get_loc("T_Az")] = fms_data["P_Az"].iloc[4]
+    geometry = VerticalSection().compute_fms_geometry(fms_data)
+    assert geometry["polygons"][0] is geometry["polygons"][8]
+    assert geometry["flagged"] == [fms_data.index[4]]
+    ax = Figure().subplots()
+    VerticalSection().draw_fms_geometry(ax, geometry)
+    assert len(ax.collections) == 3
+
+def test_bulk_vectors_arcs_and_axes():
+    fms_set = FocalMechanismSet.from_dataframe(projected_fms(30))
+    assert fms_set.plane_arcs(2).shape[0] == 30
+    assert not fms_set.check_consistency().any()
+    T_points = fms_set.project_axes("T", radius = 10)
+    assert np.all(np.hypot(*(T_points - fms_set.centers).T) <= 10 + 1e-3)
+    assert len(FocalMechanismSet.from_dataframe(projected_fms(3).iloc[:0]).compute_geometry()["polygons"]) == 0
+
+def axis_fills(focal_mechanism, unit_polygons, fill_pattern, azimuth, plunge):
+    """Fill of the quadrants whose polygon contains the projected axis."""
+    from matplotlib.path import Path
+    vector = focal_mechanism.compute_kinematic_vector(azimuth, plunge)
+    vector = -vector if vector[2] > 0 else vector
+    point = 0.999 * np.array(focal_mechanism.lambert_projection(vector[0], vector[1], vector[2])) / np.sqrt(2)
+    return [filled for unit_polygon, filled in zip(unit_polygons, fill_pattern) if Path(unit_polygon.T).contains_point(point)]
+
+def test_dip_slip_and_synthetic_polarity():
+    #Pure thrust (T vertical), pure normal (P vertical) and the synthetic mechanisms: T filled, P unfilled
+    rows = [(0, 45, 90, 180, 45, 90, 270, 0, 0, 90, 0, 0), (0, 45, -90, 180, 45, -90, 0, 90, 270, 0, 180, 0)]
+    rows += [tuple(row) for row in synthetic_fms(302)[["Strike_1", "Dip_1", "Rake_1", "Strike_2", "Dip_2", "Rake_2", "P_Az", "P_pl", "T_Az", "T_pl", "B_Az", "B_pl"]].itertuples(index = False)]
+    for row in rows:
+        focal_mechanism = FocalMechanism(1.0, (0.0, 0.0), *row)
+        unit_polygons, fill_pattern = focal_mechanism.compute_unit_template()
+        assert fill_pattern is not None and sum(fill_pattern) == 2, row
+        assert axis_fills(focal_mechanism, unit_polygons, fill_pattern, row[8], row[9]) == [True], row
+        assert axis_fills(focal_mechanism, unit_polygons, fill_pattern, row[6], row[7]) == [False], row
+    assert FocalMechanism(1.0, (0.0, 0.0), *rows[0]).compute_unit_template()[1] == (True, False, True, False)
+    assert FocalMechanism(1.0, (0.0, 0.0), *rows[1]).compute_unit_template()[1] == (False, True, False, True)
+
+def test_unclassifiable_polarity_is_flagged_and_not_drawn():
+    fms_data = projected_fms(3)
+    #T and P on the nodal planes of two vertical planes
+    fms_data.iloc[1, [fms_data.columns.get_loc(column) for column in ("Strike_1", "Dip_1", "Strike_2", "Dip_2", "P_Az", "P_pl", "T_Az", "T_pl", "B_Az", "B_pl")]] = (0, 90, 90, 90, 90, 0, 0, 0, 0, 90)
+    geometry = FocalMechanismSet.from_dataframe(fms_data).compute_geometry(radius = 10)
+    assert geometry["flagged"] == [101] and len(geometry["polygons"]) == 8
@@ -0,0 +1,186 @@
+import os
+import struct
+import numpy as np
+from utils.grid_loader import Gridloader
+from src.height_profile import Heightprofile
+
+LON_MIN, LON_MAX, LAT_MIN, LAT_MAX = -76.0, -70.0, 8.0, 13.0
+
+def synthetic_grid(nx = 61, ny = 51):
+    lon = np.linspace(LON_MIN, LON_MAX, nx)
+    lat = np.linspace(LAT_MIN, LAT_MAX, ny)
+    lon_grid, lat_grid = np.meshgrid(lon, lat)
+    return np.round(2000.0 * np.sin(lon_grid) * np.cos(lat_grid) - 1000.0, 2)
+
+def write_dsaa(path, data):
+    ny, nx = data.shape
+    with open(path, 'w') as f:
+        f.write(f"DSAA\n{nx} {ny}\n{LON_MIN} {LON_MAX}\n{LAT_MIN} {LAT_MAX}\n{data.min()} {data.max()}\n")
+        for row in data:
+            f.write(" ".join(f"{value:.2f}" for value in row) + "\n")
+
+def write_dsbb(path, data):
+    ny, nx = data.shape
+    with open(path, 'wb') as f:
+        f.write(b"DSBB" + struct.pack("<hh6d", nx, ny, LON_MIN, LON_MAX, LAT_MIN, LAT_MAX, data.min(), data.max()))
+        f.write(data.astype("<f4").tobytes())
+
+def write_dsrb(path, data):
+    ny, nx = data.shape
+    x_size, y_size = (LON_MAX - LON_MIN) / (nx - 1), (LAT_MAX - LAT_MIN) / (ny - 1)
+    with open(path, 'wb') as f:
+        f.write(b"DSRB" + struct.pack("<ii", 4, 2))
+        f.write(b"GRID" + struct.pack("<iii8d", 72, ny, nx, LON_MIN, LAT_MIN, x_size, y_size, data.min(), data.max(), 0.0, 1.70141e38))
+        f.write(b"DATA" + struct.pack("<i", data.size * 8) + data.astype("<f8").tobytes())
+
+def test_ascii_grid_sidecar_is_reused(tmp_path):
+    data = synthetic_grid()
+    grd_file = os.path.join(tmp_path, "dem.grd")
+    write_dsaa(grd_file, data)
+    lon, lat, loaded = Gridloader().load(grd_file)
+    data_path, header_path = Gridloader.cache_paths(grd_file)
+    assert os.path.exists(data_path) and os.path.exists(header_path)
+    assert isinstance(Gridloader().load(grd_file)[2], np.memmap)
+    assert np.allclose(loaded, data, atol = 1e-3)
+    assert np.allclose(lon, np.linspace(LON_MIN, LON_MAX, data.shape[1])) and np.allclose(lat, np.linspace(LAT_MIN, LAT_MAX, data.shape[0]))
+
+def test_binary_grids_match_ascii(tmp_path):
+    data = synthetic_grid()
+    for name, writer in (("dem6.grd", write_dsbb), ("dem7.grd", write_dsrb)):
+        grd_file = os.path.join(tmp_path, name)
+        writer(grd_file, data)
+        lon, lat, loaded = Gridloader().load(grd_file)
+        assert loaded.shape == data.shape
+        assert np.allclose(loaded, data, atol = 1e-3)
+        assert np.allclose(lon[[0, -1]], [LON_MIN, LON_MAX]) and np.allclose(lat[[0, -1]], [LAT_MIN, LAT_MAX])
+
+def test_extract_profile_matches_ascii_reader(tmp_path):
+    grd_file = os.path.join(tmp_path, "dem.grd")
+    write_dsaa(grd_file, synthetic_grid())
+    height_profile = Heightprofile(grd_file, [-75.5, 12.5], [-70.5, 8.5])
+    distances, elevations = height_profile.extract_profile(num_pts = 100)
+    from scipy.interpolate import RegularGridInterpolator
+    lon, lat, data_km = height_profile.read_grd_ascii(grd_file)
+    interpolator = RegularGridInterpolator((lat, lon), data_km)
+    line_lon, line_lat = np.linspace(-75.5, -70.5, 101), np.linspace(12.5, 8.5, 101)
+    assert len(distances) == 101
+    assert np.allclose(elevations, interpolator(np.column_stack((line_lat, line_lon))), atol = 1e-5)
+
+def test_extract_profiles_in_one_call(tmp_path):
+    grd_file = os.path.join(tmp_path, "dem.grd")
+    write_dsaa(grd_file, synthetic_grid())
+    profiles = [([-75.5, 12.5], [-70.5, 8.5]), ([-75.0, 9.0], [-71.0, 9.0])]
+    height_profile = Heightprofile(grd_file, *profiles[0])
+    results = height_profile.extract_profiles(profiles, num_pts = 200)
+    for (start_coords, end_coords), (distances, elevations) in zip(profiles, results):
+        single_distances, single_elevations = Heightprofile(grd_file, start_coords, end_coords).extract_profile(num_pts = 200)
+        assert np.allclose(distances, single_distances)
+        assert np.allclose(elevations, single_elevations)
+    assert np.isclose(results[1][0][-1], 111 * np.cos(np.radians(9.0)) * 4.0)
+
+def test_polyline_profile_sampled_in_one_call(tmp_path):
+    grd_file = os.path.join(tmp_path, "dem.grd")
+    write_dsaa(grd_file, synthetic_grid())
+    vertices = [[-75.5, 12.5], [-73.0, 10.0], [-70.5, 10.5]]
+    distances, elevations = Heightprofile(grd_file, vertices[0], vertices[-1], vertices = vertices).extract_profile(num_pts = 200)
+    first_distances, first_elevations = Heightprofile(grd_file, vertices[0], vertices[1]).extract_profile(num_pts = 100)
+    assert len(distances) == 201 and np.all(np.diff(distances) > 0)
+    #Flat segments share the km frame of the first vertex
+    assert np.isclose(distances[-1], first_distances[-1] + 111 * np.hypot(2.5 * np.cos(np.radians(12.5)), 0.5))
+    bend = np.argmin(np.abs(distances - first_distances[-1]))
+    assert np.isclose(elevations[bend], first_elevations[-1], atol = 0.05)
+
+def test_swath_profile_statistics_with_bounded_windows(tmp_path):
+    grd_file = os.path.join(tmp_path, "dem.grd")
+    write_dsaa(grd_file, synthetic_grid())
+    height_profile = Heightprofile(grd_file, [-75.5, 12.5], [-70.5, 8.5], projection = "geodesic")
+    swath = height_profile.extract_swath_profile(100.0, num_pts = 100, num_lines = 11)
+    distances, centerline = height_profile.extract_profile(num_pts = 100)
+    assert np.allclose(swath["distances"], distances)
+    assert np.all(swath["min"] <= swath["mean"]) and np.all(swath["mean"] <= swath["max"])
+    assert np.all((swath["min"] <= centerline + 1e-9) & (centerline <= swath["max"] + 1e-9))
+    assert np.all((swath["percentiles"][10] >= swath["min"]) & (swath["percentiles"][90] <= swath["max"]))
+    #Small windows give the same values as sampling the whole grid
+    windowed = Heightprofile(grd_file, [-75.5, 12.5], [-70.5, 8.5], projection = "geodesic")
+    windowed.window_nodes = 20
+    lons, lats = np.linspace(-75.9, -70.1, 300), np.linspace(12.9, 8.1, 300)
+    assert np.allclose(windowed.sample_elevations_windowed(lons, lats), height_profile.sample_elevations(lons, lats))
+
+def test_windowed_reads_match_full_grid(tmp_path):
+    data = synthetic_grid()
+    bounds = (-74.3, -72.1, 9.25, 10.9)
+    for name, writer, use_cache in (("dem.grd", write_dsaa, False), ("dem_cached.grd", write_dsaa, True), ("dem6.grd", write_dsbb, True), ("dem7.grd", write_dsrb, True)):
+        grd_file = os.path.join(tmp_path, name)
+        writer(grd_file, data)
+        lon, lat, full = Gridloader(use_cache = use_cache).load(grd_file)
+        window_lon, window_lat, window = Gridloader(use_cache = use_cache).load(grd_file, bounds = bounds)
+        assert not isinstance(window, np.memmap) and window.shape == (len(window_lat), len(window_lon))
+        assert window_lon[0] <= bounds[0] and window_lon[-1] >= bounds[1] and window_lat[0] <= bounds[2] and window_lat[-1] >= bounds[3]
+        assert window.size < full.size / 4
+        rows, cols = Gridloader.window_slices(lon, lat, bounds)
+        assert np.array_equal(window, np.asarray(full)[rows, cols])
+
+def test_streamed_ascii_window_stops_after_last_row(tmp_path):
+    data = synthetic_grid()
+    grd_file = os.path.join(tmp_path, "dem.grd")
+    write_dsaa(grd_file, data)
+    with open(grd_file, 'a') as f:
+        f.write("not a number\n")
+    _, window_lat, window = Gridloader(use_cache = False).load(grd_file, bounds = (-74.0, -73.0, 9.0, 10.0))
+    assert np.allclose(window, data[Gridloader.window_slices(np.linspace(LON_MIN, LON_MAX, data.shape[1]), np.linspace(LAT_MIN, LAT_MAX, data.shape[0]), (-74.0, -73.0, 9.0, 10.0))], atol = 1e-3)
+
+def test_profile_from_window_matches_whole_grid(tmp_path):
+    grd_file = os.path.join(tmp_path, "dem.grd")
+    write_dsaa(grd_file, synthetic_grid())
+    start_coords, end_coords = [-75.0, 12.0], [-72.0, 9.5]
+    distances, elevations = Heightprofile(grd_file, start_coords, end_coords).extract_profile(num_pts = 100)
+    window_distances, window_elevations = Heightprofile(grd_file, start_coords, end_coords, bounds = (-75.01, -71.99, 9.49, 12.01)).extract_profile(num_pts = 100)
+    assert np.allclose(window_distances, distances) and np.allclose(window_elevations, elevations)
+
+def test_surface_elevations_at_events_with_centerline_fallback(tmp_path):
+    grd_file = os.path.join(tmp_path, "dem.grd")
+    write_dsaa(grd_file, synthetic_grid())
+    height_profile = Heightprofile(grd_file, [-75.0, 12.0], [-71.0, 9.0])
+    distances, elevations = height_profile.extract_profile()
+    rng = np.random.default_rng(0)
+    lons, lats = rng.uniform(-75.0, -71.0, 200), rng.uniform(9.0, 12.0, 200)
+    lons[0] = -80.0 #Off the grid
+    profile_x = rng.uniform(0, distances[-1], 200)
+    surface = height_profile.surface_elevations(lons, lats, profile_x, distances, elevations)
+    np.testing.assert_allclose(surface[1:], height_profile.sample_elevations(lons[1:], lats[1:]))
+    assert np.isclose(surface[0], np.interp(profile_x[0], distances, elevations))
+    assert np.isnan(height_profile.surface_elevations(lons[:1], lats[:1])[0])
+    assert height_profile.surface_elevations([], []).shape == (0, )
+
+def test_windowed_sampling_of_unsorted_events_reads_each_tile_once(tmp_path):
+    grd_file = os.path.join(tmp_path, "dem.grd")
+    write_dsaa(grd_file, synthetic_grid())
+    height_profile = Heightprofile(grd_file, [-75.0, 12.0], [-71.0, 9.0])
+    height_profile.window_nodes = 36 #Tiles of 5 x 5 cells, 12 x 10 tiles over the 61 x 51 grid
+    rng = np.random.default_rng(1)
+    lons, lats = rng.uniform(-77.0, -69.0, 5000), rng.uniform(7.5, 13.5, 5000)
+    lons[0], lats[1] = np.nan, np.nan
+    calls = []
+    sample_window = height_profile.sample_window
+    def counted_sample_window(window_lons, window_lats):
+        rows, cols = height_profile.grid_window(window_lons, window_lats)
+        calls.append((rows.stop - rows.start) * (cols.stop - cols.start))
+        return sample_window(window_lons, window_lats)
+    height_profile.sample_window = counted_sample_window
+    elevations = height_profile.sample_elevations_windowed(lons, lats)
+    np.testing.assert_allclose(elevations, height_profile.sample_elevations(lons, lats))
+    assert len(calls) <= 120 and max(calls) <= 36
+
+def convert_grid(grd_file):
+    return Gridloader().convert_ascii(grd_file)
+
+def test_concurrent_sidecar_conversion(tmp_path):
+    from concurrent.futures import ProcessPoolExecutor
+    grd_file = os.path.join(tmp_path, "dem.grd")
+    write_dsaa(grd_file, synthetic_grid(nx = 301, ny = 251))
+    #Workers starting on a cold cache all convert the grid at the same time
+    with ProcessPoolExecutor(max_workers = 4) as executor:
+        headers = list(executor.map(convert_grid, [grd_file] * 8))
+    assert all(header == headers[0] for header in headers)
+    assert sorted(os.listdir(tmp_path)) == ["dem.grd", "dem.grd.cache.json", "dem.grd.cache.npy"]
+    assert np.allclose(Gridloader().load(grd_file)[2], Gridloader(use_cache = False).load(grd_file)[2])
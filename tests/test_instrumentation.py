@@ -0,0 +1,34 @@
+import json, tracemalloc
+import numpy as np
+from utils.instrumentation import Runreport
+
+def test_disabled_report_records_nothing(tmp_path):
+    report = Runreport()
+    with report.stage("load", rows = 10) as stage:
+        stage["rows"] = 5
+    assert report.timed("double")(lambda x: 2 * x)(3) == 6
+    report.write(str(tmp_path / "report.json"))
+    assert report.records == [] and not (tmp_path / "report.json").exists()
+
+def test_stages_record_time_memory_and_rows(tmp_path):
+    report = Runreport(enabled = True, trace_memory = True)
+    with report.stage("outer", profile = "AA'") as outer:
+        with report.stage("inner") as inner:
+            array = np.ones(2_000_000) #16 MB
+            inner["rows"] = len(array)
+        del array
+        outer["rows"] = 1
+    allocate = report.timed("allocate", rows = len)(lambda n: np.zeros(n))
+    allocate(1000)
+    records = {record["stage"]: record for record in report.records}
+    assert records["inner"]["rows"] == 2_000_000 and records["allocate"]["rows"] == 1000
+    assert records["inner"]["peak_memory_mb"] >= 15 and records["outer"]["peak_memory_mb"] >= records["inner"]["peak_memory_mb"]
+    assert records["outer"]["wall_s"] >= records["inner"]["wall_s"] and records["outer"]["profile"] == "AA'"
+    worker_records = [dict(records["allocate"], pid = -1)]
+    report.merge(worker_records)
+    assert report.summary()["allocate"]["calls"] == 2
+    assert len(report.drain()) == 3 and report.records == worker_records
+    report.write(str(tmp_path / "report.json"))
+    with open(tmp_path / "report.json") as f:
+        assert set(json.load(f)) == {"meta", "summary", "records"}
+    tracemalloc.stop()
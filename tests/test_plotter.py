@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+import pandas as pd
+from matplotlib.figure import Figure
+from src.plotter import VerticalSection
+
+def make_events(num_events, seed = 0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"Profile_X": rng.uniform(0, 100, num_events), "Depth": rng.uniform(-50, 0, num_events), "Magnitude": rng.uniform(2, 6, num_events)})
+
+def test_density_matches_histogram2d():
+    events = make_events(5000)
+    events.loc[0, "Profile_X"] = 150.0 #Outside the section
+    density, extent = VerticalSection().compute_earthquake_density(events, (0, 100), (-50, 0), bin_size = 2.0)
+    expected, _, _ = np.histogram2d(events["Depth"], events["Profile_X"], bins = (25, 50), range = ((-50, 0), (0, 100)))
+    assert extent == (0, 100, -50, 0) and density.shape == (25, 50)
+    np.testing.assert_array_equal(density, expected)
+    weighted, _ = VerticalSection().compute_earthquake_density(events, (0, 100), (-50, 0), bin_size = 2.0, weight = "magnitude")
+    assert np.isclose(weighted.sum(), events["Magnitude"].iloc[1:].sum())
+    #Events on the upper edges of the section are counted in the last bins
+    edges = pd.DataFrame({"Profile_X": [10.0, 100.0, 50.0, 100.0], "Depth": [0.0, -20.0, -250.0, 0.0], "Magnitude": [3.0, 4.0, 5.0, 6.0]})
+    density, _ = VerticalSection().compute_earthquake_density(edges, (0, 100), (-250, 0), bin_size = 2.0)
+    expected, _, _ = np.histogram2d(edges["Depth"], edges["Profile_X"], bins = (125, 50), range = ((-250, 0), (0, 100)))
+    assert density.sum() == 4
+    np.testing.assert_array_equal(density, expected)
+    with pytest.raises(ValueError):
+        VerticalSection().compute_earthquake_density(edges.assign(Magnitude = [-0.5, 1.0, 2.0, 3.0]), (0, 100), (-250, 0), weight = "magnitude")
+
+def test_draw_earthquakes_switches_to_density_above_threshold():
+    events = make_events(300)
+    plotter = VerticalSection()
+    ax = Figure().subplots()
+    assert plotter.draw_earthquakes(ax, events.copy(), (0, 100), (-50, 0), density_threshold = 1000) == "scatter"
+    assert len(ax.images) == 0
+    ax = Figure().subplots()
+    assert plotter.draw_earthquakes(ax, events.copy(), (0, 100), (-50, 0), density_threshold = 100, weight = "moment") == "density"
+    assert len(ax.images) == 1 and len(ax.collections) == 0
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic_data import synthetic_earthquakes
+from utils.projection import Profileprojection, Polylineprojection
+from utils.data_handler import Datahandler
+from utils.spatial_index import Spatialindex
+
+def test_geodesic_projection_on_the_equator():
+    projection = Profileprojection([0.0, 0.0], [10.0, 0.0], method = "geodesic")
+    radius = Profileprojection.earth_radius
+    assert np.isclose(projection.length, radius * np.radians(10.0))
+    along, across = projection.project(np.array([5.0, 5.0, -1.0]), np.array([0.0, 2.0, -3.0]))
+    assert np.allclose(along, radius * np.radians([5.0, 5.0, -1.0]))
+    assert np.allclose(across, radius * np.radians([0.0, 2.0, -3.0]))
+
+def test_flat_projection_matches_datahandler_frame():
+    earthquake_data = synthetic_earthquakes(2000)
+    datahandler = Datahandler(earthquake_data, [-73.1, 13.01], [-71.61, 10.51])
+    along, across = datahandler.projection.project(earthquake_data["Lon"].values, earthquake_data["Lat"].values)
+    profile_vector_unit, perpendicular_vector_unit, _ = datahandler.profile_polygon(100.0)
+    expected_along, expected_across = datahandler.swath_coordinates(datahandler.catalog_to_km(), profile_vector_unit, perpendicular_vector_unit)
+    assert np.allclose(along, expected_along) and np.allclose(across, expected_across)
+
+def test_geodesic_sample_line_and_swath_bounds():
+    projection = Profileprojection([-80.0, 60.0], [-40.0, 70.0], method = "geodesic")
+    lons, lats, distances = projection.sample_line(100)
+    along, across = projection.project(lons, lats)
+    assert np.allclose(along, distances) and np.allclose(across, 0.0, atol = 1e-6)
+    assert np.allclose([lons[0], lats[0], lons[-1], lats[-1]], [-80.0, 60.0, -40.0, 70.0])
+    rng = np.random.default_rng(0)
+    outline_lons, outline_lats = projection.unit_vectors_to_degrees(projection.great_circle_points(rng.uniform(0, projection.length, 5000), rng.uniform(-150.0, 150.0, 5000)))
+    lon_min, lon_max, lat_min, lat_max = projection.swath_bounds(300.0)
+    assert ((outline_lons >= lon_min) & (outline_lons <= lon_max) & (outline_lats >= lat_min) & (outline_lats <= lat_max)).all()
+
+def test_geodesic_selection_with_spatial_index():
+    earthquake_data = synthetic_earthquakes(5000)
+    datahandler = Datahandler(earthquake_data, [-74.5, 11.8], [-70.48, 9.51], projection = "geodesic")
+    indexed = Datahandler(earthquake_data, [-74.5, 11.8], [-70.48, 9.51], spatial_index = Spatialindex(earthquake_data), projection = "geodesic")
+    projected_data = datahandler.project_onto_profile(100.0, -250.0)
+    assert projected_data.index.equals(indexed.project_onto_profile(100.0, -250.0).index)
+    flat_data = Datahandler(earthquake_data, [-74.5, 11.8], [-70.48, 9.51]).project_onto_profile(100.0, -250.0)
+    assert abs(len(projected_data) - len(flat_data)) < 0.05 * len(flat_data)
+    assert (projected_data["Profile_X"].between(0, datahandler.projection.length)).all()
+
+def test_collinear_polyline_matches_straight_profile():
+    earthquake_data = synthetic_earthquakes(2000)
+    lons, lats = earthquake_data["Lon"].values, earthquake_data["Lat"].values
+    for method in ("flat", "geodesic"):
+        straight = Profileprojection([-74.0, 12.0], [-71.0, 9.0], method = method)
+        middle_vertex = np.ravel(straight.points_at(np.array([straight.length / 3])))
+        polyline = Polylineprojection([[-74.0, 12.0], middle_vertex, [-71.0, 9.0]], method = method)
+        assert np.isclose(polyline.length, straight.length, rtol = 1e-4)
+        along, across = straight.project(lons, lats)
+        polyline_along, polyline_across = polyline.project(lons, lats)
+        inside = (along >= 0) & (along <= straight.length)
+        assert np.allclose(polyline_along[inside], along[inside], atol = 0.2) and np.allclose(polyline_across[inside], across[inside], atol = 0.2)
+
+def test_polyline_nearest_segment_matches_loop():
+    vertices = [[-74.5, 12.0], [-73.0, 10.5], [-72.5, 8.5], [-71.0, 8.0]]
+    earthquake_data = synthetic_earthquakes(500)
+    polyline = Polylineprojection(vertices)
+    along, across = polyline.project(earthquake_data["Lon"].values, earthquake_data["Lat"].values)
+    for i, (lon, lat) in enumerate(zip(earthquake_data["Lon"].values, earthquake_data["Lat"].values)):
+        distances = []
+        for segment in polyline.segments:
+            segment_along, segment_across = segment.project(lon, lat)
+            distances.append(np.hypot(segment_along - np.clip(segment_along, 0, segment.length), segment_across))
+        assert np.isclose(abs(across[i]), min(distances))
+    lons, lats, distances = polyline.sample_line(300)
+    assert np.allclose(np.abs(polyline.project(lons, lats)[1]), 0.0, atol = 1e-6)
+    assert np.allclose(lons[[0, -1]], [-74.5, -71.0]) and np.isclose(distances[-1], polyline.vertex_distances[-1])
+
+def test_polyline_swath_selection():
+    vertices = [[-74.5, 12.0], [-73.0, 10.5], [-72.5, 8.5]]
+    earthquake_data = synthetic_earthquakes(5000)
+    datahandler = Datahandler(earthquake_data, vertices[0], vertices[-1], vertices = vertices, projection = "geodesic")
+    indexed = Datahandler(earthquake_data, vertices[0], vertices[-1], vertices = vertices, projection = "geodesic", spatial_index = Spatialindex(earthquake_data))
+    projected_data = datahandler.project_onto_profile(60.0, -250.0)
+    assert projected_data.index.equals(indexed.project_onto_profile(60.0, -250.0).index)
+    along, across = datahandler.projection.project(projected_data["Lon"].values, projected_data["Lat"].values)
+    assert (np.abs(across) <= 30.0).all() and np.allclose(projected_data["Profile_X"], along)
+    assert projected_data["Profile_X"].max() > datahandler.projection.vertex_distances[1]
+    #The flat km frame columns only come with flat straight profiles
+    assert "X_km" not in projected_data.columns and "Y_km" not in projected_data.columns
+    assert {"X_km", "Y_km"} <= set(Datahandler(earthquake_data, vertices[0], vertices[-1]).project_onto_profile(60.0, -250.0).columns)
+
+def test_polyline_swath_bounds_cover_outer_bends():
+    vertices = [[-74.0, 10.0], [-73.0, 11.0], [-72.0, 10.0]]
+    earthquake_data = pd.DataFrame({"Lon": [-73.0], "Lat": [11.43], "Depth": [-10.0], "Magnitude": [4.0]})
+    for method in ("flat", "geodesic"):
+        polyline = Polylineprojection(vertices, method = method)
+        assert abs(polyline.project(-73.0, 11.43)[1]) < 50.0
+        lon_min, lon_max, lat_min, lat_max = polyline.swath_bounds(100.0)
+        assert lon_min < -73.0 < lon_max and lat_min < 11.43 < lat_max
+        indexed = Datahandler(earthquake_data, vertices[0], vertices[-1], vertices = vertices, projection = method, spatial_index = Spatialindex(earthquake_data))
+        assert len(indexed.project_onto_profile(100.0, -250.0)) == 1
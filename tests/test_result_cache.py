@@ -0,0 +1,45 @@
+import os, importlib
+import pandas as pd
+from utils.result_cache import Resultcache
+from src.pipeline import result_cache_from_config, result_modules
+
+def test_profile_key_changes_only_with_its_inputs(tmp_path):
+    catalog = tmp_path / "catalog.csv"
+    catalog.write_text("Lon;Lat\n1;2\n")
+    result_cache = Resultcache(str(tmp_path / "cache"))
+    profile = {"name": "AA'", "start": [-73.1, 13.01], "end": [-71.61, 10.51], "width": 100.0, "depth": -250.0}
+    fingerprints = result_cache.input_fingerprints([str(catalog), str(tmp_path / "missing.grd")])
+    key = result_cache.profile_key(profile, fingerprints)
+    assert key == result_cache.profile_key(dict(profile), result_cache.input_fingerprints([str(catalog), str(tmp_path / "missing.grd")]))
+    assert key != result_cache.profile_key({**profile, "width": 90.0}, fingerprints)
+    catalog.write_text("Lon;Lat\n1;2\n3;4\n")
+    assert key != result_cache.profile_key(profile, result_cache.input_fingerprints([str(catalog), str(tmp_path / "missing.grd")]))
+
+def test_store_load_and_manifest(tmp_path):
+    result_cache = Resultcache(str(tmp_path / "cache"))
+    assert result_cache.load("abc") is None
+    result_cache.store("abc", {"name": "AA'", "projected_earthquake_data": pd.DataFrame({"Depth": [-10.0]})})
+    assert result_cache.contains("abc")
+    assert result_cache.load("abc")["projected_earthquake_data"]["Depth"].tolist() == [-10.0]
+    output_path = str(tmp_path / "section.png")
+    manifest = {os.path.abspath(output_path): result_cache.output_entry(["abc"], {"dpi": 300})}
+    result_cache.write_manifest(manifest)
+    assert not result_cache.is_rendered(result_cache.read_manifest(), output_path, ["abc"], {"dpi": 300})
+    open(output_path, 'wb').close()
+    assert result_cache.is_rendered(result_cache.read_manifest(), output_path, ["abc"], {"dpi": 300})
+    assert not result_cache.is_rendered(result_cache.read_manifest(), output_path, ["abd"], {"dpi": 300})
+
+def test_profile_key_follows_the_code(tmp_path):
+    module = tmp_path / "stage.py"
+    module.write_text("def compute_profile(profile):\n    return {'name': profile['name']}\n")
+    code_version = Resultcache.source_fingerprint([str(module)])
+    assert code_version == Resultcache.source_fingerprint([str(module)])
+    module.write_text("def compute_profile(profile):\n    return {'name': profile['name'], 'num_events': 0}\n")
+    assert code_version != Resultcache.source_fingerprint([str(module)])
+    profile = {"name": "AA'", "start": [-73.1, 13.01], "end": [-71.61, 10.51], "width": 100.0, "depth": -250.0}
+    assert Resultcache("cache", code_version).profile_key(profile, {}) != Resultcache("cache", Resultcache.source_fingerprint([str(module)])).profile_key(profile, {})
+    #The caches of a run are keyed by the source of the pipeline and its stages
+    result_cache = result_cache_from_config({"processing": {"cache_dir": str(tmp_path / "cache")}})
+    assert {"src.pipeline", "src.height_profile", "utils.data_handler"} <= set(result_modules)
+    assert result_cache.code_version == Resultcache.source_fingerprint([importlib.import_module(name).__file__ for name in result_modules])
+    assert result_cache_from_config({"processing": {}}) is None
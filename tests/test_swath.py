@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic_data import synthetic_earthquakes
+from utils.data_handler import Datahandler
+
+def reference_within_polygon(datahandler, profile_width, coords):
+    """Per-point clockwise-edge test, as originally written in Datahandler.filter_pts."""
+    _, _, (vertice1, vertice2, vertice3, vertice4) = datahandler.profile_polygon(profile_width)
+    def is_within_polygon(point):
+        vectors = [(vertice3 - vertice1, point - vertice1), (vertice4 - vertice3, point - vertice3), (vertice2 - vertice4, point - vertice4), (vertice1 - vertice2, point - vertice2)]
+        return all(v1[0] * v2[1] - v1[1] * v2[0] <= 0 for v1, v2 in vectors)
+    return np.array([is_within_polygon(coord) for coord in coords])
+
+def test_swath_mask_matches_clockwise_edge_test():
+    earthquake_data = synthetic_earthquakes(2000)
+    datahandler = Datahandler(earthquake_data, [-73.1, 13.01], [-71.61, 10.51])
+    #Add the swath vertices and edge midpoints so the boundary is exercised
+    _, _, vertices = datahandler.profile_polygon(100.0)
+    boundary = np.vstack(vertices + tuple((a + b) / 2 for a, b in zip(vertices, vertices[1:] + vertices[:1])))
+    coords = np.vstack((datahandler.catalog_to_km(), boundary))
+    within_polygon, profile_x = datahandler.swath_mask(100.0, coords)
+    assert np.array_equal(within_polygon, reference_within_polygon(datahandler, 100.0, coords))
+    assert within_polygon.any()
+    expected_x = np.dot(coords - datahandler.profile_start_km, datahandler.profile_polygon(100.0)[0])
+    assert np.allclose(profile_x, expected_x)
+
+def test_project_onto_profile_filters_depth():
+    earthquake_data = synthetic_earthquakes(2000)
+    datahandler = Datahandler(earthquake_data, [-73.1, 13.01], [-71.61, 10.51])
+    projected_data = datahandler.project_onto_profile(100.0, -250.0)
+    assert (projected_data["Depth"] >= -250.0).all()
+    assert ((projected_data["Profile_X"] >= 0) & (projected_data["Profile_X"] <= np.linalg.norm(datahandler.profile_end_km - datahandler.profile_start_km) + 1e-9)).all()
+
+def test_spatial_index_gives_same_selection_without_mutating_catalog():
+    from utils.spatial_index import Spatialindex
+    earthquake_data = synthetic_earthquakes(5000)
+    columns = list(earthquake_data.columns)
+    spatial_index = Spatialindex(earthquake_data, cell_size = 0.25)
+    for profile_start, profile_end in (([-73.1, 13.01], [-71.61, 10.51]), ([-76.0, 8.06], [-71.7, 8.06])):
+        full_scan = Datahandler(earthquake_data, profile_start, profile_end).project_onto_profile(100.0, -250.0)
+        indexed = Datahandler(earthquake_data, profile_start, profile_end, spatial_index = spatial_index).project_onto_profile(100.0, -250.0)
+        pd.testing.assert_frame_equal(full_scan, indexed)
+        assert len(indexed) > 0
+    assert list(earthquake_data.columns) == columns
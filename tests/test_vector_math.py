@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+from src.vector_math import Vectormath
+
+def random_mechanisms(num_mechs = 200, seed = 1):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 360, num_mechs), rng.uniform(0, 90, num_mechs), rng.uniform(-180, 180, num_mechs)
+
+def test_batch_vectors_match_scalar_vectors():
+    vector_math = Vectormath()
+    strikes, dips, rakes = random_mechanisms()
+    checks = [
+        (vector_math.compute_strike_vectors(strikes), [vector_math.compute_strike_vector(s) for s in strikes]),
+        (vector_math.compute_dip_vectors(strikes, dips), [vector_math.compute_dip_vector(s, d) for s, d in zip(strikes, dips)]),
+        (vector_math.compute_rake_vectors(strikes, dips, rakes), [vector_math.compute_rake_vector(s, d, r) for s, d, r in zip(strikes, dips, rakes)]),
+        (vector_math.compute_normal_vectors(strikes, dips), [vector_math.compute_normal_vector(s, d) for s, d in zip(strikes, dips)]),
+        (vector_math.compute_kinematic_vectors(strikes, dips), [vector_math.compute_kinematic_vector(a, p) for a, p in zip(strikes, dips)]),
+    ]
+    for batch, scalar in checks:
+        assert batch.shape == (len(strikes), 3)
+        assert np.allclose(batch, np.array(scalar), rtol = 0, atol = 1e-12)
+
+def test_compute_fms_vectors_from_dataframe():
+    fms_data = pd.DataFrame({"Strike_1": [95, 202], "Dip_1": [34, 55], "Rake_1": [153, 108], "Strike_2": [208, 353], "Dip_2": [75, 38], "Rake_2": [59, 66],
+                             "P_Az": [321, 279], "P_pl": [24, 8], "T_Az": [83, 160], "T_pl": [50, 73], "B_Az": [217, 11], "B_pl": [30, 15]})
+    vectors = Vectormath().compute_fms_vectors(fms_data)
+    assert set(vectors) == {"S1", "D1", "R1", "N1", "S2", "D2", "R2", "N2", "P", "T", "B"}
+    assert np.allclose(vectors["T"][1], Vectormath().compute_kinematic_vector(160, 73))
+
+def test_beachball_template_matches_direct_geometry():
+    from src.focal_mechanism import FocalMechanism
+    focal_mechanism = FocalMechanism(10, (50.0, -30.0), 95, 34, 153, 208, 75, 59, 321, 24, 83, 50, 217, 30)
+    nodal_plane1 = focal_mechanism.generate_plane_circle(95, 34, 217, 30)
+    nodal_plane2 = focal_mechanism.generate_plane_circle(208, 75, 217, 30)
+    direct_polygons = [focal_mechanism.translate_points(focal_mechanism.scale_points(polygon, 10), (50.0, -30.0)) for polygon in focal_mechanism.construct_quadrants(nodal_plane1, nodal_plane2)]
+    unit_polygons, fill_pattern = focal_mechanism.get_unit_template()
+    assert sum(fill_pattern) == 2
+    for direct_polygon, unit_polygon in zip(direct_polygons, unit_polygons):
+        assert np.allclose(direct_polygon, 10 * unit_polygon + np.array([[50.0], [-30.0]]))
+    hits = FocalMechanism.unit_template.cache_info().hits
+    FocalMechanism(5, (0.0, 0.0), 95.04, 34, 153, 208, 75, 59, 321, 24, 83, 50, 217, 30).get_unit_template()
+    assert FocalMechanism.unit_template.cache_info().hits == hits + 1
+
+def test_plane_arcs_run_from_strike_through_B_to_minus_strike():
+    vector_math = Vectormath()
+    strikes, dips, _ = random_mechanisms(num_mechs = 50)
+    B_azimuths, B_plunges = strikes + 30, dips / 3
+    arcs = vector_math.generate_plane_arcs(strikes, dips, B_azimuths, B_plunges, num_pts = 40)
+    assert arcs.shape == (50, 4, 40)
+    S = vector_math.compute_strike_vectors(strikes)
+    normals = vector_math.compute_normal_vectors(strikes, dips)
+    assert np.allclose(arcs[:, :3, 0], S) and np.allclose(arcs[:, :3, -1], -S)
+    assert np.all(arcs[:, 3].sum(axis = 1) == 1)
+    assert np.all(arcs[:, 2] <= 1e-12)
+    on_plane = np.abs(np.einsum("nkp,nk->np", arcs[:, :3], normals))
+    on_plane[arcs[:, 3] == 1] = 0 #B comes from the catalog axis and may be slightly off the plane
+    assert on_plane.max() < 1e-12
+    single = vector_math.generate_plane_circle(strikes[7], dips[7], B_azimuths[7], B_plunges[7], num_pts = 40)
+    assert np.allclose(single, arcs[7])
+
+def test_polarity_and_consistency_flags():
+    vector_math = Vectormath()
+    fms_data = pd.DataFrame({"Strike_1": [36, 36], "Dip_1": [70, 70], "Rake_1": [82, 82], "Strike_2": [237, 237], "Dip_2": [22, 22], "Rake_2": [110, 110],
+                             "P_Az": [132, 293], "P_pl": [25, 64], "T_Az": [293, 132], "T_pl": [64, 25], "B_Az": [39, 39], "B_pl": [8, 8]})
+    vectors = vector_math.compute_fms_vectors(fms_data)
+    #T is compressional and P is not, for the consistent row
+    assert vector_math.classify_polarity(vectors["T"], vectors["N1"], vectors["N2"], vectors["T"])[0]
+    assert not vector_math.classify_polarity(vectors["P"], vectors["N1"], vectors["N2"], vectors["T"])[0]
+    #Swapping P and T keeps both axes in opposite quadrants, so only the B and plane checks apply
+    assert not vector_math.check_fms_consistency(fms_data)[0]
+    fms_data.loc[1, "B_pl"] = 60
+    assert list(vector_math.check_fms_consistency(fms_data)) == [False, True]
+
+def test_classify_fms_data_columns():
+    fms_data = pd.DataFrame({"Strike_1": [95, 202, 0], "Dip_1": [34, 55, 90], "Rake_1": [153, 108, -90], "Strike_2": [208, 353, 90], "Dip_2": [75, 38, 45], "Rake_2": [59, 66, 0],
+                             "P_Az": [321, 279, 0], "P_pl": [24, 8, 80], "T_Az": [83, 160, 0], "T_pl": [50, 73, 5], "B_Az": [217, 11, 0], "B_pl": [30, 15, 8]})
+    classified = Vectormath().classify_fms_data(fms_data)
+    assert list(classified["Frohlich_Class"]) == ["odd", "thrust", "normal"]
+    assert list(classified["Rake_Style"]) == ["strike-slip", "reverse", "normal"]
+    assert np.allclose(classified[["Thrust_Fraction", "Normal_Fraction", "Strike_Slip_Fraction"]].sum(axis = 1).iloc[:2], 1.0, atol = 0.02)
+    assert list(classified["Planes_Consistent"]) == [True, True, False]
+    assert "Frohlich_Class" not in fms_data
+
+def test_quadrants_tile_the_unit_disc():
+    from matplotlib.path import Path
+    from benchmarks.synthetic_data import synthetic_fms
+    from src.focal_mechanism import FocalMechanism
+    rng = np.random.default_rng(0)
+    radii, angles = np.sqrt(rng.uniform(0, 0.98, 2000)), rng.uniform(0, 2 * np.pi, 2000)
+    samples = np.column_stack((radii * np.cos(angles), radii * np.sin(angles)))
+    fms_data = synthetic_fms(302)
+    #Synthetic mechanisms, pure thrust, pure normal and vertical strike-slip
+    rows = [tuple(row) for row in fms_data[["Strike_1", "Dip_1", "Rake_1", "Strike_2", "Dip_2", "Rake_2", "P_Az", "P_pl", "T_Az", "T_pl", "B_Az", "B_pl"]].itertuples(index = False)]
+    rows += [(0, 45, 90, 180, 45, 90, 270, 0, 0, 90, 0, 0), (0, 45, -90, 180, 45, -90, 0, 90, 270, 0, 180, 0), (0, 90, 0, 90, 90, 180, 45, 0, 315, 0, 0, 90)]
+    for i, row in enumerate(rows):
+        unit_polygons, _ = FocalMechanism(1.0, (0.0, 0.0), *row).compute_unit_template()
+        areas = [0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) for x, y in unit_polygons]
+        assert np.isclose(sum(np.abs(areas)), np.pi, rtol = 1e-3), row
+        if i % 25 == 0 or i >= len(rows) - 3:
+            counts = sum(Path(polygon.T).contains_points(samples).astype(int) for polygon in unit_polygons)
+            assert np.all(counts == 1), row
@@ -0,0 +1,102 @@
+"""Columnar on-disk cache of the catalogs"""
+import os, json, shutil
+import numpy as np
+import pandas as pd
+from utils.paths import Pathmanagement
+
+class Catalogcache():
+    """Stores a pruned catalog as one raw binary file per column inside `<file>.cache/`, next to the source CSV.
+
+    `schema.json` holds the source fingerprint (mtime and size), the number of rows, the dtype of every column and
+    the validated set of required columns. Columns are memory-mapped on load, so reopening an unchanged catalog does
+    not parse any text. Text columns also get a `<column>.null.bin` mask of their missing values, which come back as
+    NaN, so a cached catalog holds exactly what the CSV read gives.
+    """
+    cache_version = 3
+    string_width = 32 #Characters kept for text columns (dates and times)
+
+    @staticmethod
+    def cache_dir(file_path):
+        return file_path + ".cache"
+
+    def storage_dtype(self, dtype):
+        if dtype is str or dtype == object:
+            return np.dtype(f"<U{self.string_width}")
+        return np.dtype(dtype)
+
+    def write(self, file_path, chunks, columns):
+        """Stream the chunks of a catalog into the column files.
+
+        Args:
+            file_path (str): Location of the source CSV.
+            chunks (iterable): DataFrames holding the columns of the catalog.
+            columns (dict): Validated columns and their dtypes.
+        """
+        fingerprint = Pathmanagement.file_fingerprint(file_path)
+        cache_dir = self.cache_dir(file_path)
+        tmp_dir = cache_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors = True)
+        os.makedirs(tmp_dir)
+        stored_columns = {column: self.storage_dtype(dtype) for column, dtype in columns.items()}
+        text_columns = [column for column, dtype in stored_columns.items() if dtype.kind == "U"]
+        files = {column: open(os.path.join(tmp_dir, f"{column}.bin"), 'wb') for column in stored_columns}
+        files.update({f"{column}.null": open(os.path.join(tmp_dir, f"{column}.null.bin"), 'wb') for column in text_columns})
+        num_rows = 0
+        try:
+            for chunk in chunks:
+                for column, dtype in stored_columns.items():
+                    values = chunk[column].values
+                    if dtype.kind == "U":
+                        missing = chunk[column].isna().values
+                        values = np.where(missing, "", values)
+                        if len(chunk) and max(map(len, values)) > self.string_width:
+                            raise ValueError(f"Column {column} has values longer than {self.string_width} characters.")
+                        files[f"{column}.null"].write(missing.tobytes())
+                    files[column].write(np.ascontiguousarray(values, dtype = dtype).tobytes())
+                num_rows += len(chunk)
+        finally:
+            for f in files.values():
+                f.close()
+        schema = {"version": self.cache_version, "source": fingerprint, "num_rows": num_rows,
+                  "columns": {column: dtype.str for column, dtype in stored_columns.items()}, "text_columns": text_columns, "required_columns": sorted(columns)}
+        with open(os.path.join(tmp_dir, "schema.json"), 'w') as f:
+            json.dump(schema, f)
+        shutil.rmtree(cache_dir, ignore_errors = True)
+        os.replace(tmp_dir, cache_dir)
+
+    def read_schema(self, file_path, columns):
+        """Schema of a valid cache holding all the requested columns, or None if it is missing or stale."""
+        schema_path = os.path.join(self.cache_dir(file_path), "schema.json")
+        try:
+            with open(schema_path, 'r') as f:
+                schema = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if schema.get("version") != self.cache_version or schema.get("source") != Pathmanagement.file_fingerprint(file_path):
+            return None
+        for column, dtype in columns.items():
+            if schema["columns"].get(column) != self.storage_dtype(dtype).str:
+                return None
+        return schema
+
+    def load(self, file_path, columns):
+        """Memory-mapped catalog with the requested columns, or None if the cache cannot be used."""
+        schema = self.read_schema(file_path, columns)
+        if schema is None:
+            return None
+        cache_dir = self.cache_dir(file_path)
+        num_rows = schema["num_rows"]
+        arrays = {}
+        for column in columns:
+            dtype = np.dtype(schema["columns"][column])
+            if num_rows == 0:
+                arrays[column] = np.empty(0, dtype = dtype)
+            else:
+                arrays[column] = np.memmap(os.path.join(cache_dir, f"{column}.bin"), dtype = dtype, mode = "r", shape = (num_rows,))
+            if column in schema["text_columns"]:
+                #Text is copied into Python strings anyway, so missing values can be restored in place
+                values = arrays[column].astype(object)
+                if num_rows:
+                    values[np.fromfile(os.path.join(cache_dir, f"{column}.null.bin"), dtype = bool)] = np.nan
+                arrays[column] = values
+        return pd.DataFrame(arrays, copy = False)
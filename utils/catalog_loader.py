@@ -0,0 +1,93 @@
+"""Streaming catalog reader with column pruning and compact dtypes"""
+import numpy as np
+import pandas as pd
+from utils.catalog_cache import Catalogcache
+from utils.instrumentation import run_report
+
+class Catalogloader():
+    """Reads semicolon separated catalogs in chunks, keeping only the needed columns and the rows near the profiles.
+
+    Coordinates stay in float64 because the swath test works in km; the remaining numeric columns use float32.
+    With use_cache, the pruned catalog is also written once to a columnar Catalogcache and memory-mapped on later runs
+    while the CSV is unchanged.
+    """
+    earthquake_columns = {"Lon": np.float64, "Lat": np.float64, "Depth": np.float32, "Magnitude": np.float32}
+    fms_columns = {"Date": str, "Time_GMT": str, "Lat": np.float64, "Lon": np.float64, "Depth": np.float32, "Magnitude": np.float32,
+                   "Strike_1": np.float32, "Dip_1": np.float32, "Rake_1": np.float32, "Strike_2": np.float32, "Dip_2": np.float32, "Rake_2": np.float32,
+                   "P_Az": np.float32, "P_pl": np.float32, "T_Az": np.float32, "T_pl": np.float32, "B_Az": np.float32, "B_pl": np.float32}
+
+    def __init__(self, chunksize = 500_000, delimiter = ";", use_cache = False):
+        self.chunksize = chunksize
+        self.delimiter = delimiter
+        self.use_cache = use_cache
+
+    @staticmethod
+    def in_bounds(chunk, bounds):
+        """Mask of the rows inside any of the (lon_min, lon_max, lat_min, lat_max) bounding boxes."""
+        lons, lats = chunk["Lon"].values, chunk["Lat"].values
+        mask = np.zeros(len(chunk), dtype = bool)
+        for lon_min, lon_max, lat_min, lat_max in bounds:
+            mask |= (lons >= lon_min) & (lons <= lon_max) & (lats >= lat_min) & (lats <= lat_max)
+        return mask
+
+    def check_columns(self, file_path, columns):
+        header = pd.read_csv(file_path, delimiter = self.delimiter, nrows = 0).columns
+        required_columns = set(columns)
+        if not required_columns.issubset(header):
+            raise ValueError(f"Dataset must contain the columns: {required_columns}")
+
+    def read_catalog(self, file_path, columns, bounds = None):
+        """Read a catalog chunk by chunk.
+
+        Args:
+            file_path (str): Location of the CSV file.
+            columns (dict): Columns to keep and their dtypes (earthquake_columns or fms_columns).
+            bounds (list, optional): Bounding boxes (lon_min, lon_max, lat_min, lat_max). Rows outside all of them are
+                dropped while reading. Defaults to None (keep every row).
+
+        Raises:
+            ValueError: A required column is missing.
+
+        Returns:
+            DataFrame: The catalog with only the requested columns.
+        """
+        if self.use_cache:
+            data = self.read_cached_catalog(file_path, columns)
+            if data is not None:
+                return data[self.in_bounds(data, bounds)].reset_index(drop = True) if bounds is not None else data
+        chunks = []
+        for chunk in self.iter_chunks(file_path, columns):
+            if bounds is not None:
+                chunk = chunk[self.in_bounds(chunk, bounds)]
+            chunks.append(chunk)
+        if not chunks:
+            return pd.DataFrame({column: pd.Series(dtype = dtype) for column, dtype in columns.items()})
+        return pd.concat(chunks, ignore_index = True)[list(columns)]
+
+    def iter_chunks(self, file_path, columns):
+        self.check_columns(file_path, columns)
+        reader = pd.read_csv(file_path, delimiter = self.delimiter, usecols = list(columns), dtype = columns, chunksize = self.chunksize)
+        for chunk in reader:
+            yield chunk[list(columns)]
+
+    def read_cached_catalog(self, file_path, columns):
+        """The whole pruned catalog from the columnar cache, building the cache first if it is missing or stale."""
+        catalog_cache = Catalogcache()
+        data = catalog_cache.load(file_path, columns)
+        if data is None:
+            self.check_columns(file_path, columns)
+            try:
+                catalog_cache.write(file_path, self.iter_chunks(file_path, columns), columns)
+            except (OSError, ValueError) as e:
+                print(f"Could not write catalog cache for {file_path}: {e}")
+                return None
+            data = catalog_cache.load(file_path, columns)
+        return data
+
+    @run_report.timed("load_earthquakes", rows = len)
+    def read_earthquakes(self, file_path, bounds = None):
+        return self.read_catalog(file_path, self.earthquake_columns, bounds)
+
+    @run_report.timed("load_fms", rows = len)
+    def read_fms(self, file_path, bounds = None):
+        return self.read_catalog(file_path, self.fms_columns, bounds)
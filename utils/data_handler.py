@@ -1,28 +1,59 @@
 import pandas as pd
 import os
 import numpy as np
+from utils.projection import profile_projection
 
 class Datahandler():
-    def __init__(self, earthquake_data, profile_start, profile_end):
-        self.data = earthquake_data
+    def __init__(self, earthquake_data, profile_start, profile_end, spatial_index = None, projection = "flat", vertices = None):
+        self.data = earthquake_data #Shared between profiles, never modified here
+        self.spatial_index = spatial_index #Optional Spatialindex built once over earthquake_data
+        if spatial_index is not None and spatial_index.num_rows != len(earthquake_data):
+            raise ValueError("The spatial index was built over a different catalog.")
         #Standardize depth values to positive
         """ if (self.data["Depth"] < 0).any():
             self.data["Depth"] = -self.data["Depth"] """
 
         self.profile_start_km, self.profile_end_km = self.coordinates_to_km(profile_start, profile_end)
+        #Profile_X of the swath: "flat" (km frame of coordinates_to_km) or "geodesic" (great-circle along/cross-track),
+        #along the straight start-end segment or along the polyline of vertices when given
+        self.projection = profile_projection(vertices if vertices is not None else [profile_start, profile_end], method = projection)
     
     
     def coordinates_to_km(self, profile_start, profile_end):
         lon_to_km = 111.0 * np.cos(np.radians(profile_start[1])) #X coordinates, adjusting for variation in latitude
         lat_to_km = 111.0 #Y coordinates
-        self.data["X_km"] = self.data["Lon"] * lon_to_km
-        self.data["Y_km"] = self.data["Lat"] * lat_to_km
+        self.lon_to_km, self.lat_to_km = lon_to_km, lat_to_km
         profile_start_km = np.array(profile_start) * [lon_to_km, lat_to_km]
         profile_end_km = np.array(profile_end) * [lon_to_km, lat_to_km]
 
         return profile_start_km, profile_end_km
 
-    def filter_pts(self, profile_width, profile_depth):
+    def catalog_to_km(self, data = None):
+        """(X_km, Y_km) of the catalog rows as an (N, 2) array, without adding columns to the shared catalog."""
+        if data is None:
+            data = self.data
+        return np.column_stack((data["Lon"].values * self.lon_to_km, data["Lat"].values * self.lat_to_km))
+
+    def swath_bounds(self, profile_width, margin = 1e-6):
+        """Bounding box (lon_min, lon_max, lat_min, lat_max) in degrees of the swath, padded by margin."""
+        return self.projection.swath_bounds(profile_width, margin = margin)
+
+    def candidate_data(self, profile_width):
+        """Catalog rows that can be inside the swath: the spatial index candidates, or the whole catalog without index."""
+        if self.spatial_index is None:
+            return self.data
+        rows = self.spatial_index.query_bbox(*self.swath_bounds(profile_width))
+        return self.data.iloc[rows]
+
+    def profile_polygon(self, profile_width):
+        """Unit vectors and vertices of the swath rectangle around the profile.
+
+        Args:
+            profile_width (float): Full width of the swath (km).
+
+        Returns:
+            tuple: profile_vector_unit, perpendicular_vector_unit and the vertices (vertice1, vertice2, vertice3, vertice4).
+        """
         #Define profile vectors
         profile_vector = self.profile_end_km - self.profile_start_km
         profile_length = np.linalg.norm(profile_vector)
@@ -34,31 +65,79 @@ class Datahandler():
         vertice2 = self.profile_start_km - half_width * perpendicular_vector_unit
         vertice3 = self.profile_end_km + half_width * perpendicular_vector_unit
         vertice4 = self.profile_end_km - half_width * perpendicular_vector_unit
+        return profile_vector_unit, perpendicular_vector_unit, (vertice1, vertice2, vertice3, vertice4)
+
+    def swath_coordinates(self, coords, profile_vector_unit, perpendicular_vector_unit):
+        """Along-profile and across-profile coordinates of every point in a single pass.
+
+        Args:
+            coords (ndarray): Array of shape (N, 2) with the (X_km, Y_km) of the points.
+            profile_vector_unit (ndarray): Unit vector from profile start to profile end.
+            perpendicular_vector_unit (ndarray): Unit vector perpendicular to the profile (to its left).
 
-        def is_within_polygon(point):
-            #NOTE Polygon edge orientation: Clockwise
-            vector1 = vertice3 - vertice1
-            vector2 = vertice4 - vertice3
-            vector3 = vertice2 - vertice4
-            vector4 = vertice1 - vertice2
-            vector5 = point - vertice1
-            vector6 = point - vertice3
-            vector7 = point - vertice4
-            vector8 = point - vertice2
-            vectors = [(vector1, vector5), (vector2, vector6), (vector3, vector7), (vector4, vector8)]
-            return all(np.cross(v1, v2) <= 0 for v1, v2 in vectors)
-
-        coords = self.data[["X_km", "Y_km"]].values
-        within_polygon = np.array([is_within_polygon(coord) for coord in coords])
-        pre_filtered_data = self.data[within_polygon].copy()
-        filtered_data = pre_filtered_data[pre_filtered_data["Depth"] >= profile_depth]
+        Returns:
+            tuple: along (N, ) and across (N, ) distances in km, measured from the profile start.
+        """
+        relative_coords = coords - self.profile_start_km
+        along = np.dot(relative_coords, profile_vector_unit)
+        across = np.dot(relative_coords, perpendicular_vector_unit)
+        return along, across
+
+    def swath_mask(self, profile_width, coords = None):
+        """Batched swath membership test.
+
+        Evaluates the clockwise-edge test of the swath rectangle on the whole coordinate array at once. The cross products
+        are computed with the same arithmetic as the per-point test, so points on the boundary are kept exactly as before.
+
+        Args:
+            profile_width (float): Full width of the swath (km).
+            coords (ndarray, optional): Array of shape (N, 2) with (X_km, Y_km). Defaults to the whole catalog.
+
+        Returns:
+            tuple: Boolean mask (N, ) of points inside the swath and their Profile_X (N, ) in km.
+        """
+        if coords is None:
+            coords = self.catalog_to_km()
+        profile_vector_unit, perpendicular_vector_unit, vertices = self.profile_polygon(profile_width)
+        vertice1, vertice2, vertice3, vertice4 = vertices
+        x, y = coords[:, 0], coords[:, 1]
+        #NOTE Polygon edge orientation: Clockwise
+        edges = [(vertice1, vertice3), (vertice3, vertice4), (vertice4, vertice2), (vertice2, vertice1)]
+        within_polygon = np.ones(len(coords), dtype = bool)
+        for edge_start, edge_end in edges:
+            edge = edge_end - edge_start
+            within_polygon &= edge[0] * (y - edge_start[1]) - edge[1] * (x - edge_start[0]) <= 0
+        profile_x, _ = self.swath_coordinates(coords, profile_vector_unit, perpendicular_vector_unit)
+        return within_polygon, profile_x
+
+    def select_in_swath(self, profile_width, profile_depth):
+        """Rows inside the swath and above profile_depth, as a new DataFrame with a Profile_X column.
+
+        The flat straight profile also adds the X_km and Y_km columns of its km frame. Geodesic and polyline
+        profiles do not measure Profile_X in that frame, so they leave them out.
+        """
+        candidates = self.candidate_data(profile_width)
+        coords = None
+        if self.projection.method == "geodesic" or self.projection.num_segments > 1:
+            along, across = self.projection.project(candidates["Lon"].values, candidates["Lat"].values)
+            within_polygon = (along >= 0) & (along <= self.projection.length) & (np.abs(across) <= profile_width / 2)
+            profile_x = along
+        else:
+            coords = self.catalog_to_km(candidates)
+            within_polygon, profile_x = self.swath_mask(profile_width, coords)
+        keep = within_polygon & (candidates["Depth"].values >= profile_depth)
+        selected_data = candidates[keep].copy()
+        if coords is not None:
+            selected_data["X_km"] = coords[keep, 0]
+            selected_data["Y_km"] = coords[keep, 1]
+        selected_data["Profile_X"] = profile_x[keep]
+        return selected_data
+
+    def filter_pts(self, profile_width, profile_depth):
+        profile_vector_unit, _, _ = self.profile_polygon(profile_width)
+        filtered_data = self.select_in_swath(profile_width, profile_depth).drop(columns = "Profile_X")
 
         return profile_vector_unit,  filtered_data
     
     def project_onto_profile(self, profile_width, profile_depth):
-        profile_vector_unit, filtered_data = self.filter_pts(profile_width, profile_depth)
-        projected_data = filtered_data
-        #projections = np.dot(filtered_data[["X_km", "Y_km"]].values - self.profile_start_km, profile_vector) / profile_length
-        projections = np.dot(filtered_data[["X_km", "Y_km"]].values - self.profile_start_km, profile_vector_unit)
-        projected_data["Profile_X"] = projections
-        return projected_data
\ No newline at end of file
+        return self.select_in_swath(profile_width, profile_depth)
@@ -0,0 +1,240 @@
+"""Load Surfer grid files (DSAA, DSBB, DSRB) into memory-mapped arrays"""
+import os, json
+import numpy as np
+from utils.paths import Pathmanagement
+
+class Gridloader():
+    """Reads Surfer grids without parsing them into Python lists.
+
+    ASCII grids (DSAA) are converted once into a binary sidecar next to the source file (`<file>.cache.npy` holding the
+    values and `<file>.cache.json` holding the bounds). The sidecar is keyed on the modification time and size of the
+    source, so later runs memory-map it instead of parsing the text again. Surfer 6 (DSBB) and Surfer 7 (DSRB) binary
+    grids are memory-mapped directly.
+
+    Grid values are returned in the units of the file (meters for the DEMs used here), with rows running from the
+    minimum to the maximum latitude. With bounds, only the window of nodes covering them is read: memory-mapped grids
+    copy just that block, and ASCII grids without a sidecar are streamed row by row, keeping only the window rows.
+    """
+    cache_version = 1
+    blank_value = 1.70141e38 #Surfer value for blanked nodes
+    blank_threshold = 1e30 #Anything above this touched a blanked node
+    chunk_size = 1_000_000 #Values parsed per read when converting ASCII grids
+
+    def __init__(self, use_cache = True):
+        self.use_cache = use_cache
+
+    @staticmethod
+    def grid_format(file_path):
+        with open(file_path, 'rb') as f:
+            return f.read(4).decode("ascii", errors = "replace")
+
+    @staticmethod
+    def cache_paths(file_path):
+        return file_path + ".cache.npy", file_path + ".cache.json"
+
+    @classmethod
+    def mask_blanks(cls, values):
+        """Replace blanked (or blank-contaminated) values by NaN."""
+        values = np.asarray(values, dtype = float)
+        return np.where(np.abs(values) >= cls.blank_threshold, np.nan, values)
+
+    @staticmethod
+    def window_slices(lon_range, lat_range, bounds, pad = 1):
+        """Row and column slices from the pad-th node at or below the lower bounds to the pad-th node at or above the
+        upper bounds (at least 2 x 2 nodes).
+
+        Args:
+            lon_range (ndarray): Increasing longitudes of the grid columns.
+            lat_range (ndarray): Increasing latitudes of the grid rows.
+            bounds (tuple): (lon_min, lon_max, lat_min, lat_max) in degrees.
+            pad (int, optional): 1 keeps the nodes needed to interpolate anywhere inside bounds. Defaults to 1.
+
+        Returns:
+            tuple: rows and cols slices.
+        """
+        lon_min, lon_max, lat_min, lat_max = bounds
+        slices = []
+        for axis, low, high in ((lat_range, lat_min, lat_max), (lon_range, lon_min, lon_max)):
+            start = int(np.clip(np.searchsorted(axis, low, side = "right") - pad, 0, len(axis) - 2))
+            stop = int(np.clip(np.searchsorted(axis, high, side = "left") + pad, start + 2, len(axis)))
+            slices.append(slice(start, stop))
+        return tuple(slices)
+
+    def load(self, file_path, bounds = None):
+        """Load a Surfer grid, or only the window of it covering bounds.
+
+        Args:
+            file_path (str): Location of the DSAA, DSBB or DSRB grid.
+            bounds (tuple, optional): (lon_min, lon_max, lat_min, lat_max) in degrees. Defaults to None (whole grid).
+
+        Raises:
+            ValueError: Not a valid Surfer grid file.
+
+        Returns:
+            tuple: lon_range (nx, ), lat_range (ny, ) and data (ny, nx). The whole grid is memory-mapped when possible;
+                a window is an in-memory copy of the nodes covering bounds.
+        """
+        grid_format = self.grid_format(file_path)
+        if grid_format == "DSAA":
+            return self.load_ascii(file_path, bounds)
+        if grid_format == "DSBB":
+            grid = self.load_surfer6_binary(file_path)
+        elif grid_format == "DSRB":
+            grid = self.load_surfer7_binary(file_path)
+        else:
+            raise ValueError("Not a valid Surfer grid file.")
+        return self.read_window(*grid, bounds)
+
+    def read_window(self, lon_range, lat_range, data, bounds):
+        """Copy the window of a (memory-mapped) grid covering bounds; the whole grid when bounds is None."""
+        if bounds is None:
+            return lon_range, lat_range, data
+        rows, cols = self.window_slices(lon_range, lat_range, bounds)
+        return lon_range[cols], lat_range[rows], np.array(data[rows, cols])
+    #region ASCII grids
+    @staticmethod
+    def read_ascii_header(f):
+        header = f.readline().strip()
+        if header != b"DSAA":
+            raise ValueError("Not a valid Surfer ASCII Grid file.")
+        nx, ny = map(int, f.readline().split())
+        lon_min, lon_max = map(float, f.readline().split())
+        lat_min, lat_max = map(float, f.readline().split())
+        zmin, zmax = map(float, f.readline().split())
+        return {"nx": nx, "ny": ny, "lon_min": lon_min, "lon_max": lon_max, "lat_min": lat_min, "lat_max": lat_max, "zmin": zmin, "zmax": zmax}
+
+    def parse_ascii_values(self, f, out):
+        """Stream the grid values of an open DSAA file into a flat array, chunk by chunk."""
+        filled = 0
+        while filled < out.size:
+            chunk = np.fromfile(f, dtype = np.float64, count = min(self.chunk_size, out.size - filled), sep = " ")
+            if chunk.size == 0:
+                break
+            chunk[chunk >= self.blank_value] = np.nan
+            out[filled:filled + chunk.size] = chunk
+            filled += chunk.size
+        if filled != out.size or np.fromfile(f, dtype = np.float64, count = 1, sep = " ").size:
+            raise ValueError("Data size mismatch: expected {}, got a different number of values.".format(out.size))
+
+    def convert_ascii(self, file_path):
+        """Convert a DSAA grid into its binary sidecar and return the header."""
+        data_path, header_path = self.cache_paths(file_path)
+        fingerprint = Pathmanagement.file_fingerprint(file_path)
+        #Per-process temporary files, so workers converting the same grid at once never replace each other's files
+        tmp_data_path, tmp_header_path = f"{data_path}.{os.getpid()}.tmp.npy", f"{header_path}.{os.getpid()}.tmp"
+        with open(file_path, 'rb') as f:
+            header = self.read_ascii_header(f)
+            values = np.lib.format.open_memmap(tmp_data_path, mode = "w+", dtype = np.float32, shape = (header["ny"] * header["nx"],))
+            try:
+                self.parse_ascii_values(f, values)
+                values.flush()
+            finally:
+                del values
+        header.update({"version": self.cache_version, "source": fingerprint})
+        os.replace(tmp_data_path, data_path)
+        with open(tmp_header_path, 'w') as f:
+            json.dump(header, f)
+        os.replace(tmp_header_path, header_path)
+        return header
+
+    def read_cache_header(self, file_path):
+        """Header of a valid sidecar, or None if the sidecar is missing or stale."""
+        data_path, header_path = self.cache_paths(file_path)
+        if not (os.path.exists(data_path) and os.path.exists(header_path)):
+            return None
+        try:
+            with open(header_path, 'r') as f:
+                header = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if header.get("version") != self.cache_version or header.get("source") != Pathmanagement.file_fingerprint(file_path):
+            return None
+        return header
+
+    def parse_ascii_window(self, f, header, rows, cols):
+        """Stream the values of an open DSAA file, keeping only the nodes in the rows and cols slices.
+
+        Values are parsed a block of whole rows at a time and the rows after the window are not read.
+        """
+        nx = header["nx"]
+        window = np.empty((rows.stop - rows.start, cols.stop - cols.start), dtype = np.float32)
+        rows_per_block = max(self.chunk_size // nx, 1)
+        row = 0
+        while row < rows.stop:
+            num_rows = min(rows_per_block, rows.stop - row)
+            block = np.fromfile(f, dtype = np.float64, count = num_rows * nx, sep = " ")
+            if block.size != num_rows * nx:
+                raise ValueError("Data size mismatch: expected {}, got a different number of values.".format(header["ny"] * nx))
+            block = block.reshape((num_rows, nx))
+            first, last = max(rows.start, row), min(rows.stop, row + num_rows)
+            if first < last:
+                values = block[first - row:last - row, cols]
+                values[values >= self.blank_value] = np.nan
+                window[first - rows.start:last - rows.start] = values
+            row += num_rows
+        return window
+
+    def load_ascii(self, file_path, bounds = None):
+        header = self.read_cache_header(file_path) if self.use_cache else None
+        if header is None and self.use_cache:
+            try:
+                header = self.convert_ascii(file_path)
+            except OSError as e:
+                print(f"Could not write grid cache for {file_path}: {e}")
+        if header is not None:
+            data_path, _ = self.cache_paths(file_path)
+            data = np.load(data_path, mmap_mode = "r").reshape((header["ny"], header["nx"]))
+            lon_range = np.linspace(header["lon_min"], header["lon_max"], header["nx"])
+            lat_range = np.linspace(header["lat_min"], header["lat_max"], header["ny"])
+            return self.read_window(lon_range, lat_range, data, bounds)
+        with open(file_path, 'rb') as f:
+            header = self.read_ascii_header(f)
+            lon_range = np.linspace(header["lon_min"], header["lon_max"], header["nx"])
+            lat_range = np.linspace(header["lat_min"], header["lat_max"], header["ny"])
+            if bounds is not None:
+                rows, cols = self.window_slices(lon_range, lat_range, bounds)
+                return lon_range[cols], lat_range[rows], self.parse_ascii_window(f, header, rows, cols)
+            data = np.empty(header["ny"] * header["nx"], dtype = np.float32)
+            self.parse_ascii_values(f, data)
+        return lon_range, lat_range, data.reshape((header["ny"], header["nx"]))
+    #endregion
+    #region Binary grids
+    def load_surfer6_binary(self, file_path):
+        """Surfer 6 binary grid: int16 nx, ny, six doubles of bounds and float32 values."""
+        with open(file_path, 'rb') as f:
+            f.read(4)
+            nx, ny = np.fromfile(f, dtype = "<i2", count = 2)
+            lon_min, lon_max, lat_min, lat_max, zmin, zmax = np.fromfile(f, dtype = "<f8", count = 6)
+        nx, ny = int(nx), int(ny)
+        data = np.memmap(file_path, dtype = "<f4", mode = "r", offset = 56, shape = (ny, nx))
+        lon_range = np.linspace(lon_min, lon_max, nx)
+        lat_range = np.linspace(lat_min, lat_max, ny)
+        return lon_range, lat_range, data
+
+    def load_surfer7_binary(self, file_path):
+        """Surfer 7 binary grid: tagged sections (DSRB header, GRID, DATA) of little-endian values."""
+        grid_info = None
+        with open(file_path, 'rb') as f:
+            while True:
+                section = f.read(8)
+                if len(section) < 8:
+                    raise ValueError("Surfer 7 grid has no DATA section.")
+                tag, size = section[:4], int(np.frombuffer(section[4:], dtype = "<i4")[0])
+                if tag == b"GRID":
+                    ny, nx = np.fromfile(f, dtype = "<i4", count = 2)
+                    x_ll, y_ll, x_size, y_size, zmin, zmax, rotation, blank_value = np.fromfile(f, dtype = "<f8", count = 8)
+                    grid_info = (int(nx), int(ny), x_ll, y_ll, x_size, y_size)
+                    f.seek(size - 72, os.SEEK_CUR)
+                elif tag == b"DATA":
+                    if grid_info is None:
+                        raise ValueError("Surfer 7 grid has no GRID section before its DATA section.")
+                    offset = f.tell()
+                    break
+                else:
+                    f.seek(size, os.SEEK_CUR)
+        nx, ny, x_ll, y_ll, x_size, y_size = grid_info
+        data = np.memmap(file_path, dtype = "<f8", mode = "r", offset = offset, shape = (ny, nx))
+        lon_range = x_ll + x_size * np.arange(nx)
+        lat_range = y_ll + y_size * np.arange(ny)
+        return lon_range, lat_range, data
+    #endregion
@@ -0,0 +1,131 @@
+"""Per-stage wall time, CPU time, peak memory and row counts of a run, written as a JSON report"""
+import os, sys, json, time, platform, tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+try:
+    import resource
+except ImportError: #Windows
+    resource = None
+
+def max_rss_mb():
+    """Largest resident memory of the process so far (MB), None where getrusage is not available."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 #Kilobytes on Linux
+
+class Runreport():
+    """Records the stages of a run.
+
+    Stages are measured with the `stage` context manager or the `timed` decorator. Each record holds the stage name,
+    the profile it belongs to (if any), wall and CPU seconds, the resident memory high-water mark of the process at
+    the end of the stage, the peak memory allocated by Python and NumPy during the stage (tracemalloc, only with
+    trace_memory, as it slows NumPy-heavy stages several times), the number of rows processed and the process id, so records
+    returned by pool workers can be merged into the report of the main process. When disabled, `stage` returns a
+    shared null context and `timed` calls the function directly.
+    """
+    def __init__(self, enabled = False, trace_memory = False):
+        self.enabled = False
+        self.trace_memory = False
+        self.records = []
+        self.stack = [] #Records of the stages currently open, innermost last
+        self.null_record = {}
+        self.configure(enabled, trace_memory)
+
+    def configure(self, enabled = True, trace_memory = False):
+        """Turn the report on or off; trace_memory starts tracemalloc for the per-stage allocation peaks."""
+        self.enabled = bool(enabled)
+        self.trace_memory = bool(enabled and trace_memory)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name, profile = None, rows = None):
+        """Context manager measuring one stage. It yields the record, so rows can be set once they are known."""
+        if not self.enabled:
+            return nullcontext(self.null_record)
+        return self.measure(name, profile, rows)
+
+    @contextmanager
+    def measure(self, name, profile, rows):
+        record = {"stage": name, "profile": profile, "rows": rows, "pid": os.getpid()}
+        if self.trace_memory:
+            if self.stack: #Keep the peak of the enclosing stage before resetting it
+                self.stack[-1]["child_peak"] = max(self.stack[-1]["child_peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            record["start_memory"], record["child_peak"] = tracemalloc.get_traced_memory()[0], 0
+        self.stack.append(record)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = time.perf_counter() - wall_start
+            record["cpu_s"] = time.process_time() - cpu_start
+            record["max_rss_mb"] = max_rss_mb()
+            self.stack.pop()
+            if self.trace_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], record.pop("child_peak"))
+                record["peak_memory_mb"] = (peak - record.pop("start_memory")) / 1e6
+                if self.stack:
+                    self.stack[-1]["child_peak"] = max(self.stack[-1]["child_peak"], peak)
+            self.records.append(record)
+
+    def timed(self, name, rows = None):
+        """Decorator measuring every call of a function as a stage. rows, if given, computes the row count from the return value."""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.measure(name, None, None) as record:
+                    value = func(*args, **kwargs)
+                    if rows is not None:
+                        record["rows"] = rows(value)
+                return value
+            return wrapper
+        return decorator
+
+    def drain(self):
+        """Remove and return the records of this process (records inherited through fork are left out)."""
+        pid = os.getpid()
+        drained = [record for record in self.records if record["pid"] == pid]
+        self.records = [record for record in self.records if record["pid"] != pid]
+        return drained
+
+    def merge(self, records):
+        """Add the records returned by a worker process."""
+        if self.enabled:
+            self.records.extend(records)
+
+    def summary(self):
+        """Totals per stage: calls, wall and CPU seconds, rows and the largest memory figures."""
+        stages = {}
+        for record in self.records:
+            total = stages.setdefault(record["stage"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": 0, "max_rss_mb": None, "peak_memory_mb": None})
+            total["calls"] += 1
+            total["wall_s"] += record["wall_s"]
+            total["cpu_s"] += record["cpu_s"]
+            total["rows"] += record["rows"] or 0
+            if record.get("max_rss_mb") is not None:
+                total["max_rss_mb"] = max(total["max_rss_mb"] or 0.0, record["max_rss_mb"])
+            if "peak_memory_mb" in record:
+                total["peak_memory_mb"] = max(total["peak_memory_mb"] or 0.0, record["peak_memory_mb"])
+        return stages
+
+    def write(self, file_path):
+        """Write the report (environment, per-stage summary and every record) as JSON."""
+        if not self.enabled:
+            return
+        meta = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(), "platform": platform.platform(),
+                "argv": sys.argv, "pid": os.getpid(), "trace_memory": self.trace_memory, "max_rss_mb": max_rss_mb()}
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok = True)
+        with open(file_path, 'w') as f:
+            json.dump({"meta": meta, "summary": self.summary(), "records": self.records}, f, indent = 1, default = str)
+        print(f"Saved run report {file_path}")
+
+#Report of the current process, shared by every instrumented stage
+run_report = Runreport()
+
+def call_with_report(task):
+    """Run func(arg) for a (func, arg) task and return its value with the stage records it produced, for process pools."""
+    func, arg = task
+    value = func(arg)
+    return value, run_report.drain()
@@ -6,4 +6,10 @@ class Pathmanagement:
         if not os.path.exists(path):
             print(f"The path {path} does not exist. Creating.")
             os.makedirs(path)
-        return path
\ No newline at end of file
+        return path
+
+    @staticmethod
+    def file_fingerprint(path):
+        """Identify the current version of a file by its modification time (ns) and size (bytes)."""
+        stat = os.stat(path)
+        return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
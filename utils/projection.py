@@ -0,0 +1,211 @@
+"""Profile-aligned coordinates of lon/lat points"""
+import numpy as np
+
+class Profileprojection():
+    """Along-profile and across-profile distances (km) of points relative to a straight profile.
+
+    Two methods are available:
+        flat: the equirectangular frame used so far, 111 km per degree of latitude and 111 * cos(latitude of the
+            profile start) km per degree of longitude.
+        geodesic: the profile is the great circle through its ends on a sphere of radius earth_radius. The along
+            distance is measured on that great circle from the profile start and the across distance is the
+            cross-track distance, positive to the left of the profile. Distances stay true for long profiles and at
+            high latitude.
+
+    Every method works on whole arrays, so millions of points are projected in one pass.
+    """
+    earth_radius = 6371.0088 #Mean Earth radius (km)
+    km_per_degree = 111.0
+    methods = ("flat", "geodesic")
+    num_segments = 1
+
+    def __init__(self, profile_start, profile_end, method = "flat", reference_latitude = None):
+        if method not in self.methods:
+            raise ValueError(f"Unknown projection: {method}. Use one of {self.methods}.")
+        self.method = method
+        self.profile_start = np.asarray(profile_start, dtype = float)
+        self.profile_end = np.asarray(profile_end, dtype = float)
+        if method == "flat":
+            #Longitude scale of the latitude of the profile start, or of reference_latitude to share a frame between segments
+            reference_latitude = self.profile_start[1] if reference_latitude is None else reference_latitude
+            self.lon_to_km = self.km_per_degree * np.cos(np.radians(reference_latitude))
+            self.lat_to_km = self.km_per_degree
+            self.scale = np.array([self.lon_to_km, self.lat_to_km])
+            profile_vector = (self.profile_end - self.profile_start) * self.scale
+            self.length = np.linalg.norm(profile_vector)
+            self.profile_vector_unit = profile_vector / self.length
+            self.perpendicular_vector_unit = np.array([-self.profile_vector_unit[1], self.profile_vector_unit[0]])
+        else:
+            self.start_vector = self.unit_vectors(*self.profile_start)
+            end_vector = self.unit_vectors(*self.profile_end)
+            normal = np.cross(self.start_vector, end_vector)
+            self.normal = normal / np.linalg.norm(normal) #Pole of the profile great circle, to the left of the profile
+            self.tangent = np.cross(self.normal, self.start_vector) #Direction of the profile at its start
+            self.angle = np.arctan2(np.dot(end_vector, self.tangent), np.dot(end_vector, self.start_vector))
+            self.length = self.earth_radius * self.angle
+
+    @staticmethod
+    def unit_vectors(lons, lats):
+        """Earth-centered unit vectors of points given in degrees, shape (..., 3)."""
+        lons, lats = np.radians(lons), np.radians(lats)
+        cos_lats = np.cos(lats)
+        return np.stack((cos_lats * np.cos(lons), cos_lats * np.sin(lons), np.sin(lats)), axis = -1)
+
+    @staticmethod
+    def unit_vectors_to_degrees(vectors):
+        """Longitudes and latitudes in degrees of earth-centered unit vectors."""
+        return np.degrees(np.arctan2(vectors[..., 1], vectors[..., 0])), np.degrees(np.arcsin(np.clip(vectors[..., 2], -1.0, 1.0)))
+
+    def project(self, lons, lats):
+        """Along-profile and across-profile distances of many points.
+
+        Args:
+            lons (array_like): Longitudes in degrees.
+            lats (array_like): Latitudes in degrees, same shape as lons.
+
+        Returns:
+            tuple: along and across distances (km) with the shape of lons, measured from the profile start.
+        """
+        lons, lats = np.asarray(lons, dtype = float), np.asarray(lats, dtype = float)
+        if self.method == "flat":
+            x = (lons - self.profile_start[0]) * self.lon_to_km
+            y = (lats - self.profile_start[1]) * self.lat_to_km
+            along = x * self.profile_vector_unit[0] + y * self.profile_vector_unit[1]
+            across = x * self.perpendicular_vector_unit[0] + y * self.perpendicular_vector_unit[1]
+            return along, across
+        points = self.unit_vectors(lons, lats)
+        along = self.earth_radius * np.arctan2(points @ self.tangent, points @ self.start_vector)
+        across = self.earth_radius * np.arcsin(np.clip(points @ self.normal, -1.0, 1.0))
+        return along, across
+
+    def great_circle_points(self, along, across = 0.0):
+        """Unit vectors of the points at the given along and across distances (km) of the geodesic profile."""
+        along_angles = np.asarray(along, dtype = float)[..., np.newaxis] / self.earth_radius
+        across_angles = np.asarray(across, dtype = float)[..., np.newaxis] / self.earth_radius
+        centerline = np.cos(along_angles) * self.start_vector + np.sin(along_angles) * self.tangent
+        return np.cos(across_angles) * centerline + np.sin(across_angles) * self.normal
+
+    def points_at(self, distances, across = 0.0):
+        """Longitudes and latitudes (degrees) of the points at the given along and across distances (km), broadcast together."""
+        distances, across = np.broadcast_arrays(np.asarray(distances, dtype = float), np.asarray(across, dtype = float))
+        if self.method == "flat":
+            offsets_km = distances[..., np.newaxis] * self.profile_vector_unit + across[..., np.newaxis] * self.perpendicular_vector_unit
+            line_points = self.profile_start + offsets_km / self.scale
+            return line_points[..., 0], line_points[..., 1]
+        return self.unit_vectors_to_degrees(self.great_circle_points(distances, across))
+
+    def sample_line(self, num_pts = 500):
+        """Evenly spaced points (num_pts + 1, including both ends) along the profile.
+
+        Returns:
+            tuple: lons, lats (degrees) and distances (km) from the profile start.
+        """
+        distances = np.linspace(0, self.length, num_pts + 1)
+        lons, lats = self.points_at(distances)
+        return lons, lats, distances
+
+    def swath_bounds(self, profile_width, margin = 1e-6, num_pts = 65):
+        """Bounding box (lon_min, lon_max, lat_min, lat_max) in degrees of the swath, padded by margin.
+
+        The geodesic swath is bounded by small circles, so its outline is sampled and padded by the largest gap
+        between the samples and the curve.
+        """
+        half_width = profile_width / 2
+        if self.method == "flat":
+            offsets = np.array([[0.0, -half_width], [0.0, half_width], [self.length, -half_width], [self.length, half_width]])
+            corners_km = offsets[:, :1] * self.profile_vector_unit + offsets[:, 1:] * self.perpendicular_vector_unit
+            corners = self.profile_start + corners_km / self.scale
+            lons, lats = corners[:, 0], corners[:, 1]
+            pad = margin
+        else:
+            along, across = np.meshgrid(np.linspace(0, self.length, num_pts), np.linspace(-half_width, half_width, 9))
+            lons, lats = self.unit_vectors_to_degrees(self.great_circle_points(along, across))
+            spacing = max(self.length / (num_pts - 1), profile_width / 8) / self.earth_radius
+            pad = margin + np.degrees(spacing ** 2 / 8) / max(np.cos(np.radians(np.abs(lats).max())), 1e-6)
+        return lons.min() - pad, lons.max() + pad, lats.min() - pad, lats.max() + pad
+
+class Polylineprojection():
+    """Along-profile and across-profile distances relative to a profile made of several straight segments.
+
+    Every segment is a Profileprojection with the same method. Each point is assigned to its nearest segment, found
+    for all points and all segments at once on an (N, num_segments) array. The along distance is cumulative over the
+    segments and the across distance is the signed distance to the polyline, so the swath of a polyline is the band
+    of points closer than half its width, with rounded joins on the outer side of the bends.
+    """
+    def __init__(self, vertices, method = "flat"):
+        vertices = np.asarray(vertices, dtype = float)
+        if vertices.ndim != 2 or len(vertices) < 2:
+            raise ValueError("A profile needs at least two vertices.")
+        self.method = method
+        self.vertices = vertices
+        #Flat segments share the km frame of the first vertex, like Datahandler.coordinates_to_km
+        self.segments = [Profileprojection(vertices[i], vertices[i + 1], method = method, reference_latitude = vertices[0, 1]) for i in range(len(vertices) - 1)]
+        self.num_segments = len(self.segments)
+        self.segment_lengths = np.array([segment.length for segment in self.segments])
+        self.vertex_distances = np.concatenate(([0.0], np.cumsum(self.segment_lengths))) #Along distance of every vertex
+        self.length = self.vertex_distances[-1]
+
+    def project(self, lons, lats):
+        """Along and across distances (km) of many points, both with the shape of lons.
+
+        Points before the first vertex or after the last one keep along distances below 0 or above length.
+        """
+        lons, lats = np.asarray(lons, dtype = float), np.asarray(lats, dtype = float)
+        projected = [segment.project(lons.ravel(), lats.ravel()) for segment in self.segments]
+        along = np.stack([segment_along for segment_along, _ in projected], axis = 1) #(N, num_segments)
+        across = np.stack([segment_across for _, segment_across in projected], axis = 1)
+        clamped = np.clip(along, 0.0, self.segment_lengths)
+        distances = np.hypot(along - clamped, across)
+        nearest = np.argmin(distances, axis = 1)
+        rows = np.arange(len(nearest))
+        #Only the first and last segments extend beyond the polyline ends
+        lower = np.where(nearest == 0, -np.inf, 0.0)
+        upper = np.where(nearest == self.num_segments - 1, np.inf, self.segment_lengths[nearest])
+        polyline_along = self.vertex_distances[nearest] + np.clip(along[rows, nearest], lower, upper)
+        polyline_across = np.where(across[rows, nearest] < 0, -1.0, 1.0) * distances[rows, nearest]
+        return polyline_along.reshape(lons.shape), polyline_across.reshape(lons.shape)
+
+    def points_at(self, distances, across = 0.0):
+        """Longitudes and latitudes (degrees) of the points at the given cumulative along distances and across
+        distances (km), broadcast together. Across offsets are taken perpendicular to the segment of each distance."""
+        distances, across = np.broadcast_arrays(np.asarray(distances, dtype = float), np.asarray(across, dtype = float))
+        segment_ids = np.clip(np.searchsorted(self.vertex_distances, distances, side = "right") - 1, 0, self.num_segments - 1)
+        lons, lats = np.empty(distances.shape), np.empty(distances.shape)
+        for i, segment in enumerate(self.segments):
+            in_segment = segment_ids == i
+            lons[in_segment], lats[in_segment] = segment.points_at(distances[in_segment] - self.vertex_distances[i], across[in_segment])
+        return lons, lats
+
+    def sample_line(self, num_pts = 500):
+        """Evenly spaced points (num_pts + 1, including both ends) along the whole polyline.
+
+        Returns:
+            tuple: lons, lats (degrees) and cumulative distances (km) from the first vertex.
+        """
+        distances = np.linspace(0, self.length, num_pts + 1)
+        lons, lats = self.points_at(distances)
+        return lons, lats, distances
+
+    def swath_bounds(self, profile_width, margin = 1e-6):
+        """Bounding box (lon_min, lon_max, lat_min, lat_max) in degrees of the swath, padded by margin.
+
+        The boxes of the segments leave out the rounded joins on the outer side of the bends, so a box of half the
+        width around every interior vertex is added.
+        """
+        half_width = profile_width / 2
+        bounds = [segment.swath_bounds(profile_width, margin = margin) for segment in self.segments]
+        for lon, lat in self.vertices[1:-1]:
+            if self.method == "flat":
+                lon_pad, lat_pad = half_width / self.segments[0].scale
+            else:
+                lat_pad = np.degrees(half_width / Profileprojection.earth_radius)
+                lon_pad = lat_pad / max(np.cos(np.radians(min(abs(lat) + lat_pad, 90.0))), 1e-6)
+            bounds.append((lon - lon_pad - margin, lon + lon_pad + margin, lat - lat_pad - margin, lat + lat_pad + margin))
+        bounds = np.array(bounds)
+        return bounds[:, 0].min(), bounds[:, 1].max(), bounds[:, 2].min(), bounds[:, 3].max()
+
+def profile_projection(vertices, method = "flat"):
+    """Profileprojection for a straight profile (two vertices), Polylineprojection for more vertices."""
+    if len(vertices) == 2:
+        return Profileprojection(vertices[0], vertices[1], method = method)
+    return Polylineprojection(vertices, method = method)
@@ -0,0 +1,95 @@
+"""On-disk cache of the computed profiles, keyed by the content of their inputs"""
+import os, json, pickle, hashlib
+from utils.paths import Pathmanagement
+
+class Resultcache():
+    """Stores the result of compute_profile for each profile as `<cache_dir>/<key>.pkl`.
+
+    The key is a hash of the profile parameters, the fingerprints (mtime and size) of the catalog and DEM files, the
+    code_version (a hash of the source of the modules computing the results, see source_fingerprint) and any extra
+    settings that change the result, so editing one profile only invalidates that profile and editing the code
+    invalidates every result. `manifest.json`
+    records which profile keys and figure settings (dpi, options) were used for every rendered file, so unchanged files can be skipped.
+    """
+    cache_version = 4 #Increase when the layout of the cache files changes
+
+    def __init__(self, cache_dir, code_version = None):
+        self.cache_dir = cache_dir
+        self.code_version = code_version
+
+    @staticmethod
+    def source_fingerprint(file_paths):
+        """Hash of the content of source files, so any change to the code computing the results changes the keys."""
+        digest = hashlib.sha256()
+        for file_path in sorted(file_paths):
+            with open(file_path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    @staticmethod
+    def input_fingerprints(file_paths):
+        """Fingerprint of every input file, None for files that cannot be read."""
+        fingerprints = {}
+        for file_path in file_paths:
+            try:
+                fingerprints[file_path] = Pathmanagement.file_fingerprint(file_path)
+            except OSError:
+                fingerprints[file_path] = None
+        return fingerprints
+
+    def profile_key(self, profile, fingerprints, settings = None):
+        """Hash of everything that determines the result of one profile."""
+        content = {"version": self.cache_version, "code": self.code_version, "profile": profile, "inputs": fingerprints, "settings": settings or {}}
+        return hashlib.sha256(json.dumps(content, sort_keys = True, default = str).encode("utf-8")).hexdigest()
+
+    def result_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def contains(self, key):
+        return os.path.exists(self.result_path(key))
+
+    def load(self, key):
+        """Cached result of a profile, or None if it is missing or unreadable."""
+        try:
+            with open(self.result_path(key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def store(self, key, result):
+        """Write a result atomically, so concurrent workers never read a partial file."""
+        os.makedirs(self.cache_dir, exist_ok = True)
+        result_path = self.result_path(key)
+        tmp_path = f"{result_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(result, f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, result_path)
+        except OSError as e:
+            print(f"Could not write result cache {result_path}: {e}")
+    #region Manifest of rendered files
+    def manifest_path(self):
+        return os.path.join(self.cache_dir, "manifest.json")
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path(), 'r') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def write_manifest(self, manifest):
+        os.makedirs(self.cache_dir, exist_ok = True)
+        tmp_path = self.manifest_path() + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent = 1)
+        os.replace(tmp_path, self.manifest_path())
+
+    @staticmethod
+    def output_entry(keys, settings):
+        return {"keys": list(keys), "settings": settings}
+
+    def is_rendered(self, manifest, output_path, keys, settings):
+        """True if output_path exists and was rendered from the same profile keys and figure settings."""
+        return os.path.exists(output_path) and manifest.get(os.path.abspath(output_path)) == self.output_entry(keys, settings)
+    #endregion
@@ -0,0 +1,51 @@
+"""Spatial index over the catalog coordinates"""
+import numpy as np
+
+class Spatialindex():
+    """Uniform lon/lat grid index over a catalog, built once and shared by every profile.
+
+    Rows are bucketed into square cells of `cell_size` degrees and sorted by cell, so a bounding-box query only visits
+    the cells it overlaps. Queries return candidate row positions; the exact swath test is left to Datahandler.
+    """
+    def __init__(self, data, cell_size = 0.5, lon_column = "Lon", lat_column = "Lat"):
+        self.cell_size = cell_size
+        self.num_rows = len(data)
+        lons = np.asarray(data[lon_column].values, dtype = float) if self.num_rows else np.empty(0)
+        lats = np.asarray(data[lat_column].values, dtype = float) if self.num_rows else np.empty(0)
+        valid = np.isfinite(lons) & np.isfinite(lats)
+        rows = np.flatnonzero(valid)
+        if len(rows) == 0:
+            self.lon_min, self.lat_min, self.nx, self.ny = 0.0, 0.0, 0, 0
+            self.sorted_rows, self.sorted_cells = rows, rows
+            return
+        lons, lats = lons[valid], lats[valid]
+        self.lon_min, self.lat_min = lons.min(), lats.min()
+        ix = np.floor((lons - self.lon_min) / cell_size).astype(np.int64)
+        iy = np.floor((lats - self.lat_min) / cell_size).astype(np.int64)
+        self.nx, self.ny = int(ix.max()) + 1, int(iy.max()) + 1
+        cells = iy * self.nx + ix
+        order = np.argsort(cells, kind = "stable")
+        self.sorted_rows = rows[order]
+        self.sorted_cells = cells[order]
+
+    def query_bbox(self, lon_min, lon_max, lat_min, lat_max):
+        """Row positions of the catalog entries in the cells overlapping a bounding box (degrees).
+
+        Returns:
+            ndarray: Sorted row positions. Every row inside the box is included; rows near it may be too.
+        """
+        if self.nx == 0:
+            return np.empty(0, dtype = np.int64)
+        ix0 = int(np.floor((lon_min - self.lon_min) / self.cell_size))
+        ix1 = int(np.floor((lon_max - self.lon_min) / self.cell_size))
+        iy0 = int(np.floor((lat_min - self.lat_min) / self.cell_size))
+        iy1 = int(np.floor((lat_max - self.lat_min) / self.cell_size))
+        if ix1 < 0 or iy1 < 0 or ix0 >= self.nx or iy0 >= self.ny:
+            return np.empty(0, dtype = np.int64)
+        ix0, ix1 = max(ix0, 0), min(ix1, self.nx - 1)
+        iy0, iy1 = max(iy0, 0), min(iy1, self.ny - 1)
+        cell_rows = np.arange(iy0, iy1 + 1) * self.nx
+        starts = np.searchsorted(self.sorted_cells, cell_rows + ix0, side = "left")
+        ends = np.searchsorted(self.sorted_cells, cell_rows + ix1, side = "right")
+        candidates = np.concatenate([self.sorted_rows[start:end] for start, end in zip(starts, ends)])
+        return np.sort(candidates)